@@ -0,0 +1,230 @@
+"""
+Steps many independent games in lockstep with their state held in numpy arrays, one row per
+game, following the same rules as Game.tick.
+"""
+import numpy as np
+from runner_chaser import Grid, MovingCharacter, APPLE_COUNT
+
+RUNNING, RUNNER_WON, CHASER_WON = 0, 1, 2
+
+# Rounds of random guesses at a free square for a new apple before picking from the free squares
+SPAWN_GUESSES = 8
+
+class BatchedGame(object):
+    """
+    n_games games on grids of the same size and wall layout. Positions are (n_games, 2)
+    arrays of (x, y), apples are (n_games, apple_count, 2) positions with
+    (n_games, apple_count) shelf lives. Apples which are eaten or go off are replaced in
+    their slot, so every game holds apple_count apples unless it runs out of free squares.
+    An empty slot is at (-1, -1) with a shelf life of -1.
+    """
+
+    def __init__(self, n_games, grid_size, runner_start_pos, chaser_start_pos, win_score=100,
+            walls=(), seed=None, apple_count=None, apple_shelf_life=160,
+            runner_moves_per_turn=2, chaser_moves_per_turn=1):
+        self.n_games = n_games
+        self.grid = Grid(grid_size, walls)
+        self.walls = np.frombuffer(self.grid.walls, dtype=np.uint8).astype(bool)
+        self.win_score = win_score
+        self.apple_count = apple_count if apple_count is not None else APPLE_COUNT
+        self.apple_shelf_life = apple_shelf_life
+        self.runner_moves_per_turn = runner_moves_per_turn
+        self.chaser_moves_per_turn = chaser_moves_per_turn
+        self.rng = np.random.RandomState(seed)
+
+        self.runner_pos = np.tile(np.array(runner_start_pos, dtype=np.int32), (n_games, 1))
+        self.chaser_pos = np.tile(np.array(chaser_start_pos, dtype=np.int32), (n_games, 1))
+        self.runner_score = np.zeros(n_games, dtype=np.int32)
+        self.chaser_score = np.zeros(n_games, dtype=np.int32)
+        self.apple_pos = np.zeros((n_games, self.apple_count, 2), dtype=np.int32)
+        self.apple_life = np.zeros((n_games, self.apple_count), dtype=np.int32)
+        self.result = np.zeros(n_games, dtype=np.int8)
+        self.ticks = np.zeros(n_games, dtype=np.int32)
+
+        self.refill_apples(np.ones((n_games, self.apple_count), dtype=bool))
+
+    def running(self):
+        return self.result == RUNNING
+
+    def random_free_coords(self, games, taken):
+        """
+        Returns a random (x, y) for each of games, an array of game indexes, on a square with
+        no wall, character or apple on it, like Game.refill_apples, or (-1, -1) for a game
+        with no such square left. taken is a (len(games), apple_count) bool array of which
+        apple slots hold apples.
+        """
+        width, height = self.grid.size
+        coords = np.empty((len(games), 2), dtype=np.int32)
+        pending = np.arange(len(games))
+        # Guessing is quickest while most of the grid is free. Games still without a square
+        # after a few rounds pick from their free squares instead
+        for _ in xrange(SPAWN_GUESSES):
+            if not len(pending):
+                return coords
+            coords[pending, 0] = self.rng.randint(0, width, len(pending))
+            coords[pending, 1] = self.rng.randint(0, height, len(pending))
+            tried, owners = coords[pending], games[pending]
+            blocked = self.walls[tried[:, 1] * width + tried[:, 0]]
+            blocked |= (tried == self.runner_pos[owners]).all(axis=1)
+            blocked |= (tried == self.chaser_pos[owners]).all(axis=1)
+            blocked |= ((self.apple_pos[owners] == tried[:, np.newaxis, :]).all(axis=2) &
+                taken[pending]).any(axis=1)
+            pending = pending[blocked]
+
+        for row in pending:
+            game = games[row]
+            free = ~self.walls
+            apples = self.apple_pos[game][taken[row] & (self.apple_pos[game, :, 0] >= 0)]
+            for x, y in np.concatenate(([self.runner_pos[game], self.chaser_pos[game]],
+                    apples)):
+                free[y * width + x] = False
+            cells = np.flatnonzero(free)
+            if len(cells):
+                i = cells[self.rng.randint(0, len(cells))]
+                coords[row] = (i % width, i // width)
+            else:
+                coords[row] = (-1, -1)
+        return coords
+
+    def refill_apples(self, empty):
+        """
+        Places a fresh apple in every slot where empty, a (n_games, apple_count) bool array,
+        is set. Slots are filled one at a time so that a game's new apples keep off each other.
+        Slots left without an apple, for want of a free square, are tried again next tick.
+        """
+        empty = empty.copy()
+        for slot in xrange(self.apple_count):
+            games = np.flatnonzero(empty[:, slot])
+            empty[games, slot] = False
+            coords = self.random_free_coords(games, ~empty[games])
+            self.apple_pos[games, slot] = coords
+            self.apple_life[games, slot] = np.where(coords[:, 0] >= 0, self.apple_shelf_life,
+                -1)
+
+    def check_moves(self, positions, new_positions, max_moves_per_turn):
+        """
+        Vectorised MovingCharacter.move checks, raising MovingCharacter.IllegalMove for the
+        first game making an illegal move.
+        """
+        diff = np.abs(positions - new_positions)
+        illegal = (diff[:, 0] > 0) & (diff[:, 1] > 0)
+        illegal |= diff.max(axis=1) > max_moves_per_turn
+        illegal |= (new_positions < 0).any(axis=1)
+        illegal |= (new_positions >= np.array(self.grid.size)).any(axis=1)
+        illegal &= self.running()
+        if illegal.any():
+            i = np.flatnonzero(illegal)[0]
+            raise MovingCharacter.IllegalMove("Game %d: cannot move from %d, %d to %d, %d" % (
+                i, positions[i, 0], positions[i, 1], new_positions[i, 0], new_positions[i, 1]))
+
+    def move(self, runner_moves, chaser_moves):
+        """
+        Moves the characters of every running game to the given (n_games, 2) positions.
+        Finished games keep their positions.
+        """
+        self.check_moves(self.runner_pos, runner_moves, self.runner_moves_per_turn)
+        self.check_moves(self.chaser_pos, chaser_moves, self.chaser_moves_per_turn)
+        running = self.running()
+        self.runner_pos[running] = runner_moves[running]
+        self.chaser_pos[running] = chaser_moves[running]
+
+    def tick(self):
+        """
+        Game.tick for every running game. Instead of raising Game.Win or Game.Lose, the
+        outcome is recorded in result.
+        """
+        running = self.running()
+        self.ticks[running] += 1
+
+        caught = running & (self.runner_pos == self.chaser_pos).all(axis=1)
+        self.result[caught] = CHASER_WON
+        running &= ~caught
+
+        on_runner = (self.apple_pos == self.runner_pos[:, np.newaxis, :]).all(axis=2)
+        on_chaser = (self.apple_pos == self.chaser_pos[:, np.newaxis, :]).all(axis=2)
+        on_runner &= running[:, np.newaxis]
+        on_chaser &= running[:, np.newaxis] & ~on_runner
+        self.runner_score += on_runner.sum(axis=1)
+        self.chaser_score += on_chaser.sum(axis=1)
+
+        self.apple_life[running] -= 1
+        gone_off = (self.apple_life < 0) & running[:, np.newaxis]
+        self.refill_apples(on_runner | on_chaser | gone_off)
+
+        runner_won = running & (self.runner_score >= self.win_score)
+        chaser_won = running & ~runner_won & (self.chaser_score >= self.win_score)
+        self.result[runner_won] = RUNNER_WON
+        self.result[chaser_won] = CHASER_WON
+
+    def step(self, policy):
+        """
+        Asks policy, a function of this BatchedGame returning (runner_moves, chaser_moves),
+        where to move and then ticks.
+        """
+        self.move(*policy(self))
+        self.tick()
+
+    def run(self, policy, max_ticks=100000):
+        """
+        Steps until every game has finished or max_ticks have passed. Returns result.
+        """
+        for _ in xrange(max_ticks):
+            if not self.running().any():
+                break
+            self.step(policy)
+        return self.result
+
+
+def next_positions(positions, targets, max_moves_per_turn=1):
+    """
+    Vectorised Grid.next_pos: one move from each position towards its target as the crow
+    flies, moving along y first when the distances are equal.
+    """
+    diff = targets - positions
+    move_y = np.abs(diff[:, 1]) >= np.abs(diff[:, 0])
+    step = np.clip(diff, -max_moves_per_turn, max_moves_per_turn)
+    new_positions = positions.copy()
+    new_positions[move_y, 1] += step[move_y, 1]
+    new_positions[~move_y, 0] += step[~move_y, 0]
+    return new_positions
+
+def nearest_viable_apple(game, positions, max_moves_per_turn):
+    """
+    Player.viable_apples for every game: returns the (n_games, 2) position of the nearest
+    apple which can be reached before it goes off, the distance to it and whether there was
+    one at all. Ties go to the lowest apple slot.
+    """
+    distance = np.abs(game.apple_pos - positions[:, np.newaxis, :]).sum(axis=2)
+    distance = -(-distance // max_moves_per_turn)
+    distance = np.where(distance <= game.apple_life, distance, np.iinfo(np.int32).max)
+    nearest = distance.argmin(axis=1)
+    rows = np.arange(game.n_games)
+    found = distance[rows, nearest] != np.iinfo(np.int32).max
+    return game.apple_pos[rows, nearest], distance[rows, nearest], found
+
+def crow_flies_policy(game):
+    """
+    The RunnerPlayer and ChaserPlayer choice of target with a straight line move towards it
+    instead of an A* path: the runner heads for the nearest viable apple, the chaser for the
+    runner unless an apple is closer. Moves onto walls are skipped.
+    """
+    width = game.grid.size[0]
+    runner_target, _, runner_found = nearest_viable_apple(game, game.runner_pos,
+        game.runner_moves_per_turn)
+    runner_target = np.where(runner_found[:, np.newaxis], runner_target, game.runner_pos)
+
+    apple_target, apple_distance, apple_found = nearest_viable_apple(game, game.chaser_pos,
+        game.chaser_moves_per_turn)
+    runner_distance = np.abs(game.runner_pos - game.chaser_pos).sum(axis=1)
+    take_apple = apple_found & (apple_distance < runner_distance)
+    chaser_target = np.where(take_apple[:, np.newaxis], apple_target, game.runner_pos)
+
+    moves = []
+    for positions, targets, max_moves in (
+            (game.runner_pos, runner_target, game.runner_moves_per_turn),
+            (game.chaser_pos, chaser_target, game.chaser_moves_per_turn)):
+        new_positions = next_positions(positions, targets, max_moves)
+        blocked = game.walls[new_positions[:, 1] * width + new_positions[:, 0]]
+        new_positions[blocked] = positions[blocked]
+        moves.append(new_positions)
+    return tuple(moves)
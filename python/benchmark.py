@@ -0,0 +1,273 @@
+"""
+Benchmarks of the pathfinding and simulation code over a fixed matrix of grid sizes, wall
+layouts and moves per turn, with fixed seeds. Each case runs in a fresh process, so that its
+peak memory is its own. Results are compared with a stored baseline and the run fails if a
+case has regressed past the baseline's thresholds.
+
+Only nodes expanded and peak memory are gated, as they don't depend on the machine. Operations
+per second are reported for information, relative to a fixed calibration loop timed in the same
+process, as the baseline may have been stored on a machine of a different speed.
+
+    python benchmark.py                              # run everything, compare with the baseline
+    python benchmark.py --size 80x45 --benchmark find_path
+    python benchmark.py --save-baseline              # store this run as the new baseline
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+from collections import deque, namedtuple
+from random import Random
+from timeit import default_timer
+from headless import simulate, grid_size_arg, wall_coords
+from runner_chaser import Game, RunnerPlayer
+
+SIZES = [(80, 45), (400, 300), (2000, 2000)]
+LAYOUTS = ["central", "maze", "open"]
+MOVES_PER_TURN = [1, 2]
+# Full games take too long on the larger grids, where the AI searches a maze's disconnected
+# parts all the way through
+GAME_SIZES = [(80, 45), (160, 90)]
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+# A case regresses if its nodes expanded or peak memory rise above these multiples of the
+# baseline's
+THRESHOLDS = {
+    "nodes_expanded": 1.0,
+    "peak_memory_mb": 1.25,
+}
+
+Case = namedtuple("Case", ["benchmark", "grid_size", "walls", "moves_per_turn"])
+
+def case_name(case):
+    return "%s/%dx%d/%s/%s" % (case.benchmark, case.grid_size[0], case.grid_size[1],
+        case.walls, case.moves_per_turn or "-")
+
+def repetitions(grid_size, small, large):
+    """
+    Scales the amount of repetitions down from small for the smallest grid to large for the
+    largest, keeping the larger cases to a reasonable time.
+    """
+    return large if grid_size[0] * grid_size[1] > 1000000 else small
+
+def make_game(case, apple_count=0):
+    width, height = case.grid_size
+    return Game(case.grid_size, (0, height - 1), (width - 1, 0),
+        walls=wall_coords(case.walls, case.grid_size), rng=Random(0), apple_count=apple_count)
+
+def random_free_coords(game, rng, n):
+    grid = game.grid
+    coords = []
+    while len(coords) < n:
+        c = (rng.randint(0, grid.size[0] - 1), rng.randint(0, grid.size[1] - 1))
+        if not grid.is_wall(c):
+            coords.append(c)
+    return coords
+
+def calibrate():
+    """
+    Returns how many times per second this machine runs a fixed breadth first search over an
+    open 100x100 grid, the fastest of three runs, to measure the other cases' speed against.
+    """
+    width = 100
+    fastest = None
+    for _ in xrange(3):
+        started = default_timer()
+        seen = bytearray(width * width)
+        seen[0] = 1
+        queue = deque([0])
+        while queue:
+            i = queue.popleft()
+            x, y = i % width, i // width
+            for j, inside in ((i + 1, x + 1 < width), (i - 1, x > 0),
+                    (i + width, y + 1 < width), (i - width, y > 0)):
+                if inside and not seen[j]:
+                    seen[j] = 1
+                    queue.append(j)
+        seconds = default_timer() - started
+        fastest = seconds if fastest is None else min(fastest, seconds)
+    return 1.0 / fastest
+
+def bench_find_path(case, **player_options):
+    """
+    Searches between random pairs of open squares with A*, avoiding nothing.
+    """
+    game = make_game(case)
+    game.runner.max_moves_per_turn = case.moves_per_turn
+    player = RunnerPlayer(game, **player_options)
+    game.grid.adjacency(case.moves_per_turn)
+    queries = repetitions(case.grid_size, 20, 2)
+    coords = random_free_coords(game, Random(1), 2 * queries)
+
+    started = default_timer()
+    for i in xrange(queries):
+        game.runner.position = coords[2 * i]
+        player.path = None
+        player.find_path(coords[2 * i + 1])
+    return queries, default_timer() - started, player.nodes_expanded
+
+def bench_find_path_hierarchical(case):
+    """
+    The same searches as bench_find_path over the grid's ClusterGraph, including the time
+    taken to work out the clusters they pass through.
+    """
+    return bench_find_path(case, use_hierarchy=True)
+
+def bench_surrounding_valid_coords(case):
+    game = make_game(case)
+    grid = game.grid
+    grid.adjacency(case.moves_per_turn)
+    calls = 100000
+    coords = random_free_coords(game, Random(1), 1000)
+
+    started = default_timer()
+    for i in xrange(calls):
+        grid.surrounding_valid_coords(coords[i % 1000], case.moves_per_turn)
+    return calls, default_timer() - started, 0
+
+def bench_tick(case):
+    """
+    Ticks a game whose characters stand still, with an apple for every 200 squares.
+    """
+    width, height = case.grid_size
+    game = make_game(case, max(2, width * height // 200))
+    ticks = repetitions(case.grid_size, 2000, 200)
+
+    started = default_timer()
+    for _ in xrange(ticks):
+        game.tick()
+    return ticks, default_timer() - started, 0
+
+def bench_game(case):
+    """
+    Plays seeded headless games to a score of 20 or 1000 ticks, counting ticks as operations.
+    """
+    ticks = nodes_expanded = 0
+    started = default_timer()
+    for seed in xrange(3):
+        result = simulate(seed, case.grid_size, case.walls, win_score=20, max_ticks=1000)
+        ticks += result.ticks
+        nodes_expanded += result.runner_nodes_expanded + result.chaser_nodes_expanded
+    return ticks, default_timer() - started, nodes_expanded
+
+BENCHMARKS = {
+    "find_path": bench_find_path,
+    "find_path_hierarchical": bench_find_path_hierarchical,
+    "surrounding_valid_coords": bench_surrounding_valid_coords,
+    "tick": bench_tick,
+    "game": bench_game,
+}
+
+def cases(benchmarks=None, sizes=None):
+    """
+    Returns the matrix of cases, optionally only for the given benchmarks and grid sizes.
+    """
+    matrix = []
+    for benchmark in sorted(BENCHMARKS):
+        if benchmarks and benchmark not in benchmarks:
+            continue
+        for grid_size in (GAME_SIZES if benchmark == "game" else SIZES):
+            if sizes and grid_size not in sizes:
+                continue
+            for walls in LAYOUTS:
+                if benchmark in ("find_path", "find_path_hierarchical",
+                        "surrounding_valid_coords"):
+                    for moves_per_turn in MOVES_PER_TURN:
+                        matrix.append(Case(benchmark, grid_size, walls, moves_per_turn))
+                else:
+                    matrix.append(Case(benchmark, grid_size, walls, None))
+    return matrix
+
+def run_case(case):
+    """
+    Runs a case and returns its name and results. Meant to be run in a process of its own.
+    Cases on all but the largest grids are run three times and timed by the fastest run,
+    to keep down the noise from whatever else the machine is doing.
+    """
+    ops, seconds, nodes_expanded = min(BENCHMARKS[case.benchmark](case)
+        for _ in xrange(repetitions(case.grid_size, 3, 1)))
+    return case_name(case), {
+        "calibration_per_second": calibrate(),
+        "ops": ops,
+        "seconds": seconds,
+        "ops_per_second": ops / seconds if seconds else 0.0,
+        "nodes_expanded": nodes_expanded,
+        "peak_memory_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+    }
+
+def relative_speed(result, baseline):
+    """
+    Returns result's ops per second as a multiple of baseline's, each relative to the speed
+    of the calibration loop in its own run, or None if they can't be compared.
+    """
+    if not baseline["ops_per_second"] or "calibration_per_second" not in baseline:
+        return None
+    return (result["ops_per_second"] / result["calibration_per_second"]) / \
+        (baseline["ops_per_second"] / baseline["calibration_per_second"])
+
+def regressions(result, baseline, thresholds):
+    """
+    Returns the names of the measurements in result which regressed from baseline.
+    """
+    regressed = []
+    for measurement in ("nodes_expanded", "peak_memory_mb"):
+        if result[measurement] > baseline[measurement] * thresholds[measurement]:
+            regressed.append(measurement)
+    return regressed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark pathfinding and simulation.")
+    parser.add_argument("--benchmark", action="append", choices=sorted(BENCHMARKS),
+        help="only run this benchmark, can be given more than once")
+    parser.add_argument("--size", action="append", type=grid_size_arg,
+        help="only run this grid size, can be given more than once")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline file to compare with")
+    parser.add_argument("--save-baseline", action="store_true",
+        help="store the results in the baseline file instead of comparing with it")
+    args = parser.parse_args(argv)
+
+    baseline = { "thresholds": THRESHOLDS, "results": {} }
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print "%-48s %12s %10s %9s  %s" % ("case", "ops/s", "nodes", "peak MB", "vs baseline")
+    # A new process for every case, one at a time so they don't compete for the CPU
+    pool = multiprocessing.Pool(1, maxtasksperchild=1)
+    failed = 0
+    try:
+        for name, result in pool.imap(run_case, cases(args.benchmark, args.size)):
+            previous = baseline["results"].get(name)
+            if args.save_baseline:
+                baseline["results"][name] = result
+                comparison = "saved"
+            elif previous is None:
+                comparison = "no baseline"
+            else:
+                regressed = regressions(result, previous, baseline["thresholds"])
+                failed += bool(regressed)
+                speed = relative_speed(result, previous)
+                comparison = "%.2fx calibrated ops/s" % speed if speed is not None else "-"
+                if regressed:
+                    comparison += ", REGRESSED: " + ", ".join(regressed)
+            print "%-48s %12.1f %10d %9.1f  %s" % (name, result["ops_per_second"],
+                result["nodes_expanded"], result["peak_memory_mb"], comparison)
+            sys.stdout.flush()
+    finally:
+        pool.terminate()
+        pool.join()
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+    elif failed:
+        print "%d cases regressed" % failed
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
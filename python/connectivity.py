@@ -0,0 +1,419 @@
+"""
+Connected components of a grid's free squares, so that a target which can't be reached is
+rejected by comparing two labels rather than by a search flooding everything it can reach.
+
+Labels are kept up to date as walls change by relabelling only the components a changed
+square touches: a new wall can only split the component it was in, and a removed one can
+only join the components around it. A player's avoid set is checked separately, as it
+changes every tick. Where it may cut a component up, the squares within a box around it are
+split into pieces, which are joined up by labels of the squares outside the box. Those come
+from the component labels, apart from parts of components the box cuts off, which are found
+by flooding outwards from around the box. They don't depend on the avoid set, so they're
+kept for the last few boxes, which are lined up on tiles so that an avoid set moving a
+square or two usually keeps its box. Squares are referred to by their index in the grid's
+flat arrays.
+"""
+from array import array
+from collections import OrderedDict, deque
+
+# How far around an avoid set to look for ways round it before splitting it into pieces
+AVOID_MARGIN = 2
+# Boxes around avoid sets start and end on multiples of this many squares
+BOX_TILE = 8
+# Boxes whose outside labels are kept
+BOX_CACHE = 16
+# Most avoid set shapes and the walls around them to keep cut_by's findings for
+BORDER_CACHE = 4096
+
+class Components(object):
+    """
+    Component labels of a grid for characters moving up to moves_per_turn squares at a time
+    along rows and columns. Walls are labelled -1.
+    """
+
+    def __init__(self, grid, moves_per_turn=1):
+        self.grid = grid
+        self.width, self.height = grid.size
+        self.walls = grid.walls
+        self.moves_per_turn = moves_per_turn
+        self.labels = array('i', [-1]) * len(self.walls)
+        self.next_label = 0
+        # Maps boxes to the labels of the squares outside them, least recently used first
+        self.outsides = OrderedDict()
+        # Maps the shape of an avoid set and the walls around it to the squares bordering it
+        # which reach each other near it, each group as squares counted across the walls
+        self.border_groups = {}
+        self.invalidate()
+
+    def neighbours(self, i):
+        """
+        Returns the free squares one move from i, in the same order as Grid.adjacency.
+        """
+        # Worked out inline rather than with Grid.adjacency while fixing the labels, as the
+        # walls have just changed and its tables would all have to be built again first.
+        # Labelling everything and checks made between wall changes use its tables.
+        width, height, walls = self.width, self.height, self.walls
+        x, y = i % width, i // width
+        squares = []
+        for step in xrange(1, self.moves_per_turn + 1):
+            for j, inside in ((i + step, x + step < width), (i - step, x - step >= 0),
+                    (i + step * width, y + step < height), (i - step * width, y - step >= 0)):
+                if inside and not walls[j]:
+                    squares.append(j)
+        return squares
+
+    def fill(self, source, label):
+        """
+        Gives label to every square reachable from source.
+        """
+        labels = self.labels
+        labels[source] = label
+        stack = [source]
+        while stack:
+            for j in self.neighbours(stack.pop()):
+                if labels[j] != label:
+                    labels[j] = label
+                    stack.append(j)
+
+    def new_label(self):
+        self.next_label += 1
+        return self.next_label - 1
+
+    def invalidate(self, squares=None):
+        """
+        Fixes the labels after the walls of squares have changed. Labels everything again if
+        squares is None.
+        """
+        labels, walls = self.labels, self.walls
+        self.outsides.clear()
+        if squares is None:
+            self.label_all()
+            return
+
+        # Anything labelled from here on has been labelled since the walls changed
+        fresh = self.next_label
+        added = [i for i in squares if walls[i]]
+        for i in added:
+            labels[i] = -1
+        # Every piece a new wall splits its component into holds one of its neighbours
+        for i in added:
+            for j in self.neighbours(i):
+                if labels[j] < fresh:
+                    self.fill(j, self.new_label())
+        # Filling from a removed wall takes in every component it joins
+        for i in squares:
+            if not walls[i] and labels[i] < fresh:
+                self.fill(i, self.new_label())
+
+    def label_all(self):
+        """
+        Labels every square from scratch. Grid.adjacency's tables are quicker to flood with
+        than working out each square's moves, and searches need them for these walls anyway.
+        """
+        offsets, neighbours = self.grid.adjacency(self.moves_per_turn)
+        labels, walls = self.labels, self.walls
+        labels[:] = array('i', [-1]) * len(walls)
+        for source in xrange(len(walls)):
+            if walls[source] or labels[source] != -1:
+                continue
+            label = self.new_label()
+            labels[source] = label
+            stack = [source]
+            while stack:
+                i = stack.pop()
+                for j in neighbours[offsets[i]:offsets[i + 1]]:
+                    if labels[j] != label:
+                        labels[j] = label
+                        stack.append(j)
+
+    def label(self, i):
+        return self.labels[i]
+
+    def connected(self, a, b):
+        """
+        Returns whether b can be reached from a, ignoring anything to avoid.
+        """
+        return self.labels[a] == self.labels[b] and self.labels[a] >= 0
+
+    def enclosed(self, i, avoid):
+        """
+        Returns whether every move from square i is into avoid, a GridOverlay.
+        """
+        offsets, neighbours = self.grid.adjacency(self.moves_per_turn)
+        mask = avoid.mask
+        return all(mask[j] for j in neighbours[offsets[i]:offsets[i + 1]])
+
+    def cut_by(self, avoid):
+        """
+        Returns whether avoid, a GridOverlay, may cut squares of a component off from each
+        other, apart from squares it encloses. It can't if the free squares bordering it can
+        all reach each other without going through it within a few squares of it, as any way
+        through it can then go round. A False answer is certain, a True one may not be.
+        """
+        if not avoid.indexes:
+            return False
+
+        # Which of the squares bordering avoid reach each other near it only depends on the
+        # shape of avoid and the walls around it, which are the same for most of an open grid
+        width, height, r = self.width, self.height, self.moves_per_turn
+        xs = [i % width for i in avoid.indexes]
+        ys = [i // width for i in avoid.indexes]
+        margin = r + max(AVOID_MARGIN, r)
+        x0, y0 = max(min(xs) - margin, 0), max(min(ys) - margin, 0)
+        x1, y1 = min(max(xs) + margin, width - 1), min(max(ys) + margin, height - 1)
+        span = x1 - x0 + 1
+        walls = self.walls
+        key = (span, frozenset((y - y0) * span + x - x0 for x, y in zip(xs, ys)),
+            "".join(str(walls[y * width + x0:y * width + x1 + 1]) for y in xrange(y0, y1 + 1)))
+        groups = self.border_groups.get(key)
+        if groups is None:
+            if len(self.border_groups) >= BORDER_CACHE:
+                self.border_groups.clear()
+            groups = self.border_groups[key] = [[(i // width - y0) * span + i % width - x0
+                for i in group] for group in self.border_reach(avoid)]
+
+        # Squares of different components were never going to reach each other
+        labels = set(self.labels[(y0 + group[0] // span) * width + x0 + group[0] % span]
+            for group in groups)
+        return len(labels) < len(groups)
+
+    def border_reach(self, avoid):
+        """
+        Returns the free squares bordering avoid, a GridOverlay, which it doesn't enclose,
+        grouped by which of them can reach each other within a few squares of avoid without
+        going through it.
+        """
+        offsets, neighbours = self.grid.adjacency(self.moves_per_turn)
+        width, mask = self.width, avoid.mask
+        border = set()
+        checked = set()
+        for i in avoid.indexes:
+            for j in neighbours[offsets[i]:offsets[i + 1]]:
+                if mask[j] or j in checked:
+                    continue
+                checked.add(j)
+                # Squares avoid encloses are left out, as they're only cut off from the rest
+                for k in neighbours[offsets[j]:offsets[j + 1]]:
+                    if not mask[k]:
+                        border.add(j)
+                        break
+
+        xs = [i % width for i in avoid.indexes]
+        ys = [i // width for i in avoid.indexes]
+        margin = self.moves_per_turn + AVOID_MARGIN
+        x0, y0 = max(min(xs) - margin, 0), max(min(ys) - margin, 0)
+        x1, y1 = min(max(xs) + margin, width - 1), min(max(ys) + margin, self.height - 1)
+        # The squares the groups may reach each other through
+        walls = self.walls
+        near = set(i for y in xrange(y0, y1 + 1)
+            for i in xrange(y * width + x0, y * width + x1 + 1) if not walls[i] and not mask[i])
+
+        groups = []
+        while border:
+            source = border.pop()
+            near.discard(source)
+            group = [source]
+            stack = [source]
+            while stack and border:
+                i = stack.pop()
+                for j in neighbours[offsets[i]:offsets[i + 1]]:
+                    if j in near:
+                        near.remove(j)
+                        stack.append(j)
+                        if j in border:
+                            border.remove(j)
+                            group.append(j)
+            groups.append(group)
+        return groups
+
+    def pieces(self, avoid):
+        """
+        Returns the Pieces avoid, a GridOverlay, cuts the grid's free squares into, or None if
+        cut_by finds it can't cut any off from each other apart from those it encloses.
+        """
+        if not self.cut_by(avoid):
+            return None
+        return Pieces(self, avoid)
+
+    def box(self, avoid):
+        """
+        Returns (x0, y0, x1, y1), inclusive, of the tiles holding every square within one
+        move of avoid, a GridOverlay.
+        """
+        width, r, tile = self.width, self.moves_per_turn, BOX_TILE
+        xs = [i % width for i in avoid.indexes]
+        ys = [i // width for i in avoid.indexes]
+        return (max((min(xs) - r) // tile * tile, 0),
+            max((min(ys) - r) // tile * tile, 0),
+            min((max(xs) + r) // tile * tile + tile - 1, self.width - 1),
+            min((max(ys) + r) // tile * tile + tile - 1, self.height - 1))
+
+    def outside(self, box):
+        """
+        Returns the Outside of box, labelling the squares outside it by which of them can
+        reach each other without going into it.
+        """
+        outside = self.outsides.get(box)
+        if outside is not None:
+            self.outsides[box] = self.outsides.pop(box)
+            return outside
+
+        outside = self.outsides[box] = Outside(self, box)
+        while len(self.outsides) > BOX_CACHE:
+            self.outsides.popitem(last=False)
+        return outside
+
+class Outside(object):
+    """
+    Labels of the squares outside a box by which of them can reach each other without going
+    into it. Taking the box out of a component can only cut it where the squares next to
+    the box end up apart, so only those squares are flooded from, all at once, until every
+    component they're in has at most one part left that hasn't been flooded all the way
+    through. That part keeps its component's label, so squares which weren't reached are
+    labelled by their component. The parts flooded all the way through, cut off from the
+    rest, get new labels above the components'.
+    """
+
+    def __init__(self, components, box):
+        offsets, neighbours = components.grid.adjacency(components.moves_per_turn)
+        width, walls, labels = components.width, components.walls, components.labels
+        self.box = box
+        self.labels = labels
+        x0, y0, x1, y1 = box
+
+        # Maps the free squares one move out of the box to the components they're in
+        ring = {}
+        for y in xrange(y0, y1 + 1):
+            for i in xrange(y * width + x0, y * width + x1 + 1):
+                if walls[i]:
+                    continue
+                for j in neighbours[offsets[i]:offsets[i + 1]]:
+                    if not (x0 <= j % width <= x1 and y0 <= j // width <= y1):
+                        ring[j] = labels[j]
+        by_component = {}
+        for i, label in ring.iteritems():
+            by_component.setdefault(label, []).append(i)
+
+        # Maps the squares of cut off parts to their labels
+        self.parts = {}
+        self.next_label = components.next_label
+        for squares in by_component.itervalues():
+            if len(squares) > 1:
+                self.split(components, squares)
+        self.ring = dict((i, self.label(i)) for i in ring)
+
+    def split(self, components, squares):
+        """
+        Floods from squares, the squares next to the box in one component, a square from each
+        flood in turn, joining up floods which meet, until all but one have run out. Labels
+        the squares of the floods which ran out.
+        """
+        offsets, neighbours = components.grid.adjacency(components.moves_per_turn)
+        width = components.width
+        x0, y0, x1, y1 = self.box
+        # Maps each square reached to the flood which reached it, which floods joining up
+        # into others point to
+        owner = dict((i, i) for i in squares)
+        parent = dict(owner)
+        frontier = dict((i, deque([i])) for i in squares)
+        running = list(squares)
+        finished = []
+        while len(running) > 1:
+            still_running = []
+            for flood in running:
+                if parent[flood] != flood:
+                    continue
+                queue = frontier[flood]
+                if not queue:
+                    finished.append(flood)
+                    continue
+                i = queue.popleft()
+                for j in neighbours[offsets[i]:offsets[i + 1]]:
+                    if x0 <= j % width <= x1 and y0 <= j // width <= y1:
+                        continue
+                    other = owner.get(j)
+                    if other is None:
+                        owner[j] = flood
+                        queue.append(j)
+                        continue
+                    while parent[other] != other:
+                        other = parent[other]
+                    if other != flood:
+                        parent[other] = flood
+                        queue.extend(frontier.pop(other))
+                still_running.append(flood)
+            running = [flood for flood in still_running if parent[flood] == flood]
+
+        if not finished:
+            return
+        part_labels = {}
+        for flood in finished:
+            part_labels[flood] = self.next_label
+            self.next_label += 1
+        for i, flood in owner.iteritems():
+            while parent[flood] != flood:
+                flood = parent[flood]
+            if flood in part_labels:
+                self.parts[i] = part_labels[flood]
+
+    def label(self, i):
+        """
+        Returns the label of square i, which must be outside the box and free.
+        """
+        return self.parts.get(i, self.labels[i])
+
+class Pieces(object):
+    """
+    The pieces an avoid set, a GridOverlay, cuts a grid's free squares into, for characters
+    which can't go through it. Squares in each piece can reach each other without going
+    through avoid. Squares in avoid aren't in any piece.
+    """
+
+    def __init__(self, components, avoid):
+        offsets, neighbours = components.grid.adjacency(components.moves_per_turn)
+        width, walls, mask = components.width, components.walls, avoid.mask
+        x0, y0, x1, y1 = components.box(avoid)
+        self.outside = components.outside((x0, y0, x1, y1))
+        ring = self.outside.ring
+        # The pieces of the squares inside the box, numbered down from -1 so as not to clash
+        # with the outside labels they're joined up with
+        self.inside = inside = {}
+        self.parent = {}
+        piece = 0
+        for y in xrange(y0, y1 + 1):
+            for source in xrange(y * width + x0, y * width + x1 + 1):
+                if walls[source] or mask[source] or source in inside:
+                    continue
+                piece -= 1
+                self.parent[piece] = piece
+                inside[source] = piece
+                stack = [source]
+                while stack:
+                    i = stack.pop()
+                    for j in neighbours[offsets[i]:offsets[i + 1]]:
+                        if mask[j]:
+                            continue
+                        label = ring.get(j)
+                        if label is not None:
+                            self.join(piece, label)
+                        elif j not in inside:
+                            inside[j] = piece
+                            stack.append(j)
+
+    def find(self, node):
+        parent = self.parent
+        while parent.get(node, node) != node:
+            node = parent[node]
+        return node
+
+    def join(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self.parent[a] = b
+
+    def piece(self, i):
+        """
+        Returns the piece square i, which mustn't be in avoid, is in.
+        """
+        piece = self.inside.get(i)
+        return self.find(self.outside.label(i) if piece is None else piece)
@@ -0,0 +1,214 @@
+"""
+Pygame drawing for runner_chaser. Kept apart from the game itself so that games can be run
+without pygame installed.
+
+Games are watched with watch, which runs the simulation at its own rate and draws frames at
+a capped rate in between, so a long game doesn't have to wait for a redraw every tick.
+"""
+import pygame
+import time
+from itertools import chain
+from numpy import interp
+from runner_chaser import Grid
+from headless import step
+
+GRID_POINT_DISTANCE = 10
+DRAW_OPEN_SET = False
+DRAW_CLOSED_SET = False
+DRAW_PATH = False
+
+window = None
+# The latest debug overlays reported by the players, drawn by every Renderer frame until
+# they're replaced
+overlays = {}
+
+def open_window(grid_size):
+    """
+    Opens the pygame window for a grid of the given size. The window is also kept at module
+    level for the A* debug overlays, which are fired as events without a window argument.
+    """
+    global window
+    pygame.init()
+    window = pygame.display.set_mode((
+        GRID_POINT_DISTANCE * (grid_size[0] + 1),
+        GRID_POINT_DISTANCE * (grid_size[1] + 1)))
+    return window
+
+def get_position(grid_coords):
+    """
+    Takes grid coords and returns an (x, y) tuple of the on-screen coords.
+    """
+    x = (grid_coords[0] + 1) * GRID_POINT_DISTANCE
+    y = (grid_coords[1] + 1) * GRID_POINT_DISTANCE
+    return (x, y)
+
+def draw_grid(game, window):
+    s = game.grid.size
+    d = GRID_POINT_DISTANCE
+    
+    window.fill((0, 0, 0))
+    ix = 0
+    for x in xrange(s[0]):
+        iy = 0
+        for y in xrange(s[1]):
+            if game.grid.is_wall((ix, iy)):
+                pos = get_position((ix, iy))
+                pygame.draw.rect(window, (255, 255, 255), pygame.Rect(pos[0], pos[1], 3, 3))
+            else:
+                pygame.draw.circle(window, (40, 40, 40), get_position((ix, iy)), 1)
+            iy += 1
+        ix += 1
+
+def draw_character(window, character):
+    """
+    Returns the rectangle drawn over.
+    """
+    return pygame.draw.circle(window, character.colour, get_position(character.position), 10)
+    
+def draw_path(path):
+    """
+    Player.path_found handler. Only records the path, it's drawn with the next frame.
+    """
+    if DRAW_PATH:
+        overlays["path"] = path
+    
+def draw_sets(open_set, closed_set, character_position, target_coords):
+    """
+    Player.successors_evaluated handler. Only records the sets, which are drawn as they are
+    when the next frame comes.
+    """
+    if DRAW_OPEN_SET or DRAW_CLOSED_SET:
+        overlays["sets"] = (open_set, closed_set, character_position, target_coords)
+
+def paint_path(window, path):
+    """
+    Returns the rectangles drawn over.
+    """
+    # Fill in path
+    return [pygame.draw.circle(window, (0, 0, 255), get_position(node.pos), 3)
+        for node in path]
+
+def paint_sets(window, open_set, closed_set, character_position, target_coords):
+    """
+    Returns the rectangles drawn over.
+    """
+    rects = []
+    if DRAW_OPEN_SET:
+        for coords, node in open_set.iteritems():
+            if coords == character_position:
+                continue
+            rects.append(
+                pygame.draw.circle(window, (255, 255, 255), get_position(coords), 3, 1))
+
+    if DRAW_CLOSED_SET:
+        # Fill in closed set
+        for coords, node in closed_set.iteritems():
+            if coords == character_position:
+                continue
+            red = interp(node.h, (0, Grid.distance(character_position, target_coords)), (0, 255))
+            #red = 255
+            rects.append(
+                pygame.draw.circle(window, (red, 255 - red, 0), get_position(coords), 5))
+    return rects
+
+def draw_all(game, window):
+    draw_grid(game, window)
+    for apple in game.apples:
+        draw_character(window, apple)
+    draw_character(window, game.runner)
+    draw_character(window, game.chaser)
+    pygame.display.flip()
+
+
+class Renderer(object):
+    """
+    Draws frames of a game onto window, repainting only what has changed since the last one.
+    The grid and walls are drawn once onto a background surface, which is blitted back over
+    wherever characters and overlays were drawn last frame, so the cost of a frame depends on
+    the number of things on the grid rather than its size. Overlays are drawn on top.
+    """
+
+    def __init__(self, game, window):
+        self.game = game
+        self.window = window
+        self.background = None
+        self.wall_version = None
+        # Rectangles drawn over the background last frame
+        self.drawn = []
+
+    def prepare_background(self):
+        """
+        Draws the background if it hasn't been or the walls have changed since. Returns
+        whether it was drawn.
+        """
+        grid = self.game.grid
+        if self.background is not None and self.wall_version == grid.wall_version:
+            return False
+        self.background = pygame.Surface(self.window.get_size())
+        draw_grid(self.game, self.background)
+        self.wall_version = grid.wall_version
+        return True
+
+    def draw(self):
+        """
+        Draws a frame and pushes it to the display. Returns the list of rectangles updated.
+        """
+        window = self.window
+        if self.prepare_background():
+            window.blit(self.background, (0, 0))
+            dirty = [window.get_rect()]
+        else:
+            dirty = self.drawn
+            for rect in dirty:
+                window.blit(self.background, rect, rect)
+        
+        game = self.game
+        self.drawn = [draw_character(window, c)
+            for c in chain(game.apples, (game.runner, game.chaser))]
+        if "path" in overlays:
+            self.drawn += paint_path(window, overlays["path"])
+        if "sets" in overlays:
+            self.drawn += paint_sets(window, *overlays["sets"])
+        dirty = dirty + self.drawn
+        pygame.display.update(dirty)
+        return dirty
+
+
+def watch(game, players, renderer, ticks_per_second=60, frames_per_second=30, max_ticks=None):
+    """
+    Plays the game like headless.play while drawing it with renderer, until somebody wins,
+    max_ticks have passed or the window is closed. Ticks run on a fixed timestep of
+    ticks_per_second, catching up after slow frames, or as fast as they can if it's None.
+    Frames are drawn between ticks no more than frames_per_second times a second, with the
+    window caption showing the scores. Returns a tuple of the winner ("runner", "chaser" or
+    None) and the number of ticks.
+    """
+    tick_interval = 1.0 / ticks_per_second if ticks_per_second else 0.0
+    frame_interval = 1.0 / frames_per_second
+    next_tick = next_frame = time.time()
+    ticks = 0
+    winner = None
+    scores = None
+    
+    while winner is None and (max_ticks is None or ticks < max_ticks):
+        now = time.time()
+        if now >= next_frame:
+            if any(event.type == pygame.QUIT for event in pygame.event.get()):
+                break
+            if scores != (game.runner.score, game.chaser.score):
+                scores = (game.runner.score, game.chaser.score)
+                pygame.display.set_caption("Runner %d - %d Chaser" % scores)
+            renderer.draw()
+            next_frame = max(next_frame + frame_interval, now)
+        
+        if now < next_tick:
+            time.sleep(min(next_tick, next_frame) - now)
+            continue
+        
+        winner = step(game, players)
+        ticks += 1
+        # Don't try to catch up on more than a second of ticks
+        next_tick = max(next_tick + tick_interval, now - 1.0)
+    
+    renderer.draw()
+    return winner, ticks
@@ -1,22 +1,61 @@
 class Event:
+    """
+    Calls its handlers in the order they were added whenever it's fired. Code firing an
+    event in a hot loop can keep hold of its handlers list, which is only ever changed in
+    place, and skip the call and building its arguments while the list is empty.
+
+    Handlers can be added sampled, seeing only every nth firing, or batched, getting a list
+    of the (args, kargs) of several firings at once: every batch_size firings, and whatever
+    has built up whenever flush is called. Arguments are kept by reference until delivered.
+    """
+
     def __init__(self):
-        self.handlers = set()
+        self.handlers = []
+        # Maps each handler to what's called for it, which is the handler itself unless it's
+        # sampled or batched
+        self.subscriptions = {}
 
-    def handle(self, handler):
-        self.handlers.add(handler)
+    def handle(self, handler, every=1, batched=False, batch_size=None):
+        """
+        Parameters:
+        every:
+            Call handler for the first firing and every nth one after that.
+        batched:
+            Deliver the sampled firings to handler as a list, on flush.
+        batch_size:
+            Also deliver a batch as soon as it holds this many firings. Implies batched.
+        """
+        if handler in self.subscriptions:
+            return self
+        subscription = handler
+        if batched or batch_size is not None:
+            subscription = Batch(subscription, batch_size)
+        if every != 1:
+            subscription = Sample(subscription, every)
+        self.subscriptions[handler] = subscription
+        self.handlers.append(subscription)
         return self
 
     def unhandle(self, handler):
         try:
-            self.handlers.remove(handler)
-        except:
+            subscription = self.subscriptions.pop(handler)
+        except KeyError:
             raise ValueError("Handler is not handling this event, so cannot unhandle it.")
+        self.handlers.remove(subscription)
         return self
 
     def fire(self, *args, **kargs):
         for handler in self.handlers:
             handler(*args, **kargs)
 
+    def flush(self):
+        """
+        Delivers whatever the batched handlers have built up.
+        """
+        for handler in self.handlers:
+            if isinstance(handler, (Batch, Sample)):
+                handler.flush()
+
     def getHandlerCount(self):
         return len(self.handlers)
 
@@ -24,3 +63,48 @@ class Event:
     __isub__ = unhandle
     __call__ = fire
     __len__  = getHandlerCount
+
+
+class Sample(object):
+    """
+    Passes on the first of every few firings.
+    """
+
+    __slots__ = ("handler", "every", "fired")
+
+    def __init__(self, handler, every):
+        self.handler = handler
+        self.every = every
+        self.fired = 0
+
+    def __call__(self, *args, **kargs):
+        if self.fired % self.every == 0:
+            self.handler(*args, **kargs)
+        self.fired += 1
+
+    def flush(self):
+        if isinstance(self.handler, Batch):
+            self.handler.flush()
+
+
+class Batch(object):
+    """
+    Collects the (args, kargs) of firings and passes them on as a list.
+    """
+
+    __slots__ = ("handler", "size", "payloads")
+
+    def __init__(self, handler, size=None):
+        self.handler = handler
+        self.size = size
+        self.payloads = []
+
+    def __call__(self, *args, **kargs):
+        self.payloads.append((args, kargs))
+        if self.size is not None and len(self.payloads) >= self.size:
+            self.flush()
+
+    def flush(self):
+        if self.payloads:
+            payloads, self.payloads = self.payloads, []
+            self.handler(payloads)
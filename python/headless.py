@@ -0,0 +1,194 @@
+"""
+Runs games to completion without drawing them, for tuning the AI over large numbers of games.
+
+    python headless.py --games 1000 --seed 0 --size 80x45 --walls central
+"""
+import argparse
+import os
+import sys
+import time
+from collections import namedtuple
+from random import Random
+from runner_chaser import Game, RunnerPlayer, ChaserPlayer, central_wall, random_maze
+from metrics import Metrics, instrument
+from replay import Recorder
+
+GameResult = namedtuple("GameResult", [
+    "seed", "winner", "ticks", "runner_score", "chaser_score",
+    "runner_nodes_expanded", "chaser_nodes_expanded"])
+
+WALL_LAYOUTS = {
+    "central": central_wall,
+    "maze": random_maze,
+    "open": lambda grid_size: [],
+}
+
+def wall_coords(walls, grid_size):
+    """
+    Returns wall coordinates for walls, which is either the name of one of WALL_LAYOUTS or
+    an iterable of (x, y) tuples.
+    """
+    if isinstance(walls, basestring):
+        try:
+            return WALL_LAYOUTS[walls](grid_size)
+        except KeyError:
+            raise ValueError("Unknown wall layout '%s', expected one of: %s" % (
+                walls, ", ".join(sorted(WALL_LAYOUTS))))
+    return list(walls)
+
+def step(game, players):
+    """
+    Lets the players move and ticks the game once. Returns the winner ("runner" or "chaser")
+    if that ended it, otherwise None.
+    """
+    for p in players:
+        p.make_move()
+
+    # Looked up on the game rather than imported, so that this also works for games made by
+    # runner_chaser.py run as a script, whose classes belong to __main__
+    try:
+        game.tick()
+    except game.Win:
+        return "runner"
+    except game.Lose:
+        return "chaser"
+    return None
+
+def play(game, players, max_ticks=None):
+    """
+    Lets the players move and ticks the game until somebody wins or max_ticks have passed.
+    Returns a tuple of the winner ("runner", "chaser" or None) and the number of ticks.
+    """
+    ticks = 0
+    while max_ticks is None or ticks < max_ticks:
+        ticks += 1
+        winner = step(game, players)
+        if winner is not None:
+            return winner, ticks
+
+    return None, ticks
+
+def simulate(seed, grid_size=(80, 45), walls="central", win_score=100, max_ticks=100000,
+        apple_count=None, apple_shelf_life=None, chaser_danger_zone=3, lookahead_time=None,
+        metrics=None, record=None, trajectories=None, **player_options):
+    """
+    Plays a single game between a RunnerPlayer and a ChaserPlayer, starting in opposite
+    corners, and returns a GameResult. Games with the same arguments play out identically,
+    unless the runner's lookahead_time is given, as its search goes as deep as time allows.
+    Any player_options are passed on to both players. If metrics, a Metrics, is given the
+    game is measured into it, and if record, a file name, is given it's recorded there as a
+    replay log. If trajectories, a TrajectoryWriter, is given every tick is written to it.
+    """
+    game = Game(grid_size, (0, grid_size[1] - 1), (grid_size[0] - 1, 0), win_score,
+        wall_coords(walls, grid_size), Random(seed), apple_count, apple_shelf_life)
+    p_runner = RunnerPlayer(game, chaser_danger_zone, lookahead_time, **player_options)
+    p_chaser = ChaserPlayer(game, **player_options)
+    if metrics is not None:
+        instrument(game, [ p_runner, p_chaser ], metrics)
+    if record is not None:
+        recorder = Recorder(open(record, "wb"), game, seed)
+    if trajectories is not None:
+        trajectories.record(game, [ p_runner, p_chaser ], seed)
+
+    try:
+        winner, ticks = play(game, [ p_runner, p_chaser ], max_ticks)
+    finally:
+        if record is not None:
+            recorder.close()
+        if trajectories is not None:
+            trajectories.finish()
+
+    return GameResult(seed, winner, ticks, game.runner.score, game.chaser.score,
+        p_runner.nodes_expanded, p_chaser.nodes_expanded)
+
+def grid_size_arg(value):
+    try:
+        width, height = [int(v) for v in value.lower().split("x")]
+    except ValueError:
+        raise argparse.ArgumentTypeError("Grid size must look like 80x45, not '%s'" % value)
+    return (width, height)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run seeded runner/chaser games headlessly.")
+    parser.add_argument("--games", type=int, default=100, help="number of games to run")
+    parser.add_argument("--seed", type=int, default=0,
+        help="seed of the first game, each following game uses the next seed")
+    parser.add_argument("--size", type=grid_size_arg, default=(80, 45), help="grid size, WxH")
+    parser.add_argument("--walls", choices=sorted(WALL_LAYOUTS), default="central",
+        help="wall layout")
+    parser.add_argument("--win-score", type=int, default=100)
+    parser.add_argument("--max-ticks", type=int, default=100000,
+        help="give up on a game with no winner after this many ticks")
+    parser.add_argument("--incremental", action="store_true",
+        help="replan with Moving Target D* Lite instead of fresh A* searches")
+    parser.add_argument("--distance-fields", action="store_true",
+        help="measure distances around walls with per-tick distance fields")
+    parser.add_argument("--jump-points", action="store_true",
+        help="search with Jump Point Search for characters moving one square at a time")
+    parser.add_argument("--path-cache", action="store_true",
+        help="share found paths between searches through an LRU cache")
+    parser.add_argument("--hierarchy", action="store_true",
+        help="plan over clusters of the grid (HPA*) rather than square by square")
+    parser.add_argument("--connectivity", action="store_true",
+        help="give up on targets walled or cut off from a player before searching for them")
+    parser.add_argument("--search-budget", type=int, metavar="NODES",
+        help="most nodes an A* search may expand per move, carrying on the next move")
+    parser.add_argument("--search-time", type=float, metavar="SECONDS",
+        help="most time an A* search may take per move, carrying on the next move")
+    parser.add_argument("--lookahead", type=float, metavar="SECONDS",
+        help="search the runner's and chaser's moves ahead for this long each move while "
+        "the chaser is near")
+    parser.add_argument("--quiet", action="store_true", help="only print the summary")
+    parser.add_argument("--profile", metavar="FILE",
+        help="measure the games and write the metrics to FILE as JSON, - for stdout")
+    parser.add_argument("--record", metavar="DIR",
+        help="record every game to DIR/<seed>.replay")
+    parser.add_argument("--trajectories", metavar="DIR",
+        help="write every tick of every game to memory-mapped column files in DIR")
+    args = parser.parse_args(argv)
+    if args.record and not os.path.isdir(args.record):
+        os.makedirs(args.record)
+
+    metrics = Metrics() if args.profile else None
+    trajectories = None
+    if args.trajectories:
+        # Imported here as it's the only part of running games headlessly which needs numpy
+        from trajectories import TrajectoryWriter
+        trajectories = TrajectoryWriter(args.trajectories)
+
+    wins = { "runner": 0, "chaser": 0, None: 0 }
+    total_ticks = 0
+    started = time.time()
+    if not args.quiet:
+        print ",".join(GameResult._fields)
+    for seed in xrange(args.seed, args.seed + args.games):
+        result = simulate(seed, args.size, args.walls, args.win_score, args.max_ticks,
+            incremental=args.incremental, use_distance_fields=args.distance_fields,
+            use_jump_points=args.jump_points, use_path_cache=args.path_cache,
+            use_hierarchy=args.hierarchy, use_connectivity=args.connectivity,
+            search_budget=args.search_budget, search_time=args.search_time,
+            lookahead_time=args.lookahead, metrics=metrics,
+            record=os.path.join(args.record, "%d.replay" % seed) if args.record else None,
+            trajectories=trajectories)
+        wins[result.winner] += 1
+        total_ticks += result.ticks
+        if not args.quiet:
+            print ",".join(str(v) for v in result)
+    elapsed = time.time() - started
+    if trajectories is not None:
+        trajectories.close()
+
+    print "Runner won %d, chaser won %d, unfinished %d of %d games" % (
+        wins["runner"], wins["chaser"], wins[None], args.games)
+    print "%d ticks in %.2fs (%.0f ticks/s)" % (
+        total_ticks, elapsed, total_ticks / elapsed if elapsed else 0)
+
+    if metrics is not None:
+        if args.profile == "-":
+            metrics.dump(sys.stdout)
+        else:
+            with open(args.profile, "w") as out:
+                metrics.dump(out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""
+Hierarchical path finding (HPA*, Botea, Mueller and Schaeffer, 2004) for very large grids.
+
+The grid is split into square clusters. Each stretch of squares where a character can cross
+between two neighbouring clusters becomes an entrance: a pair of squares, one either side of
+the border. Searches run over the much smaller graph of entrances, using the number of moves
+between the entrances of a cluster found by searching inside it, and only the start of the
+path found is refined into squares, the rest as it's reached.
+
+Clusters are worked out the first time a search passes through them and forgotten when a wall
+inside them changes, so neither a huge grid nor changing its walls costs more than the
+clusters searches actually use. Squares are referred to by their index in the grid's flat
+arrays.
+"""
+from collections import deque
+from heapq import heappush, heappop
+from itertools import count
+
+# Stretches of crossings longer than this get an entrance at each end rather than one in the
+# middle, so that paths don't have to detour to the middle of a long open border
+LONG_ENTRANCE = 6
+
+# Paths between entrances bend and round up their moves, which the straight line heuristic
+# can't know about, so over long distances it falls further and further short and the search
+# spreads out. Weighting it keeps the search narrow for paths only slightly longer.
+HEURISTIC_WEIGHT = 1.1
+
+class ClusterGraph(object):
+    """
+    The entrance graph of a grid for characters moving up to moves_per_turn squares at a
+    time along rows and columns.
+    """
+
+    def __init__(self, grid, moves_per_turn=1, cluster_size=16):
+        self.grid = grid
+        self.width, self.height = grid.size
+        self.walls = grid.walls
+        self.moves_per_turn = moves_per_turn
+        # Clusters a whole number of moves wide, so that moves only ever cross into a
+        # neighbour and entrances can all lie on squares a whole number of moves apart
+        r = moves_per_turn
+        self.cluster_size = (max(cluster_size, r) + r - 1) // r * r
+        self.clusters_across = (self.width + self.cluster_size - 1) // self.cluster_size
+        self.clusters_down = (self.height + self.cluster_size - 1) // self.cluster_size
+        # Maps (cluster, cluster) pairs, lowest first, to their entrances as (square, square)
+        self.borders = {}
+        # Maps clusters to {entrance square: [(square, moves), ...]} for their entrances
+        self.edges = {}
+        self.expansions = 0
+
+    def cluster(self, i):
+        size = self.cluster_size
+        return (i // self.width // size) * self.clusters_across + i % self.width // size
+
+    def bounds(self, c):
+        """
+        Returns (x0, y0, x1, y1) of the squares in cluster c, the end coordinates exclusive.
+        """
+        size = self.cluster_size
+        x0 = c % self.clusters_across * size
+        y0 = c // self.clusters_across * size
+        return (x0, y0, min(x0 + size, self.width), min(y0 + size, self.height))
+
+    def neighbour_clusters(self, c):
+        cx, cy = c % self.clusters_across, c // self.clusters_across
+        clusters = []
+        if cx + 1 < self.clusters_across:
+            clusters.append(c + 1)
+        if cx > 0:
+            clusters.append(c - 1)
+        if cy + 1 < self.clusters_down:
+            clusters.append(c + self.clusters_across)
+        if cy > 0:
+            clusters.append(c - self.clusters_across)
+        return clusters
+
+    def search_cluster(self, source, c):
+        """
+        Breadth first search from source within cluster c. Returns dicts of the moves to
+        each square reached and of the square each was reached from.
+        """
+        return self.search(source, self.bounds(c))
+
+    def search(self, source, bounds, goal=None):
+        """
+        Breadth first search from source within bounds, stopping early if goal is reached.
+        """
+        # Moves are worked out inline, in the same order as Grid.adjacency, as this is where
+        # building clusters spends most of its time
+        width, walls, r = self.width, self.walls, self.moves_per_turn
+        x0, y0, x1, y1 = bounds
+        distances = { source: 0 }
+        came_from = {}
+        queue = deque([source])
+        while queue:
+            i = queue.popleft()
+            if i == goal:
+                break
+            d = distances[i] + 1
+            x, y = i % width, i // width
+            for step in xrange(1, r + 1):
+                for j, inside in ((i + step, x + step < x1), (i - step, x - step >= x0),
+                        (i + step * width, y + step < y1), (i - step * width, y - step >= y0)):
+                    if inside and j not in distances and not walls[j]:
+                        distances[j] = d
+                        came_from[j] = i
+                        queue.append(j)
+        return distances, came_from
+
+    def search_nearby(self, start, goal):
+        """
+        Returns the shortest path from start to goal which stays within the clusters around
+        start's, or None if there isn't one or goal isn't in one of those clusters. Paths
+        through entrances can be far longer than the shortest between such close squares.
+        """
+        size, width = self.cluster_size, self.width
+        if abs(start % width // size - goal % width // size) > 1 or \
+                abs(start // width // size - goal // width // size) > 1:
+            return None
+        x0, y0, x1, y1 = self.bounds(self.cluster(start))
+        bounds = (max(x0 - size, 0), max(y0 - size, 0),
+            min(x1 + size, self.width), min(y1 + size, self.height))
+        came_from = self.search(start, bounds, goal)[1]
+        if goal not in came_from:
+            return None
+        path = [goal]
+        while path[-1] != start:
+            path.append(came_from[path[-1]])
+        path.reverse()
+        return path
+
+    def border(self, a, b):
+        """
+        Returns the entrances between neighbouring clusters a and b, a being the lower.
+        """
+        entrances = self.borders.get((a, b))
+        if entrances is not None:
+            return entrances
+
+        width, walls, r = self.width, self.walls, self.moves_per_turn
+        x0, y0, x1, y1 = self.bounds(a)
+        if a // self.clusters_across == b // self.clusters_across:
+            # b is to the right, so crossings run along x at each y
+            along, start, edge, limit, stride = xrange(y0, y1), x0, x1, self.width, 1
+            square = lambda position, depth: position * width + edge - depth
+        else:
+            # b is below, so crossings run along y at each x
+            along, start, edge, limit, stride = xrange(x0, x1), y0, y1, self.height, width
+            square = lambda position, depth: (edge - depth) * width + position
+
+        # Every way across the border at each position along it
+        crossings = {}
+        for position in along:
+            for depth in xrange(1, r + 1):
+                if edge - depth < start:
+                    break
+                u = square(position, depth)
+                if walls[u]:
+                    continue
+                for d in xrange(depth, r + 1):
+                    if edge - depth + d >= limit:
+                        break
+                    v = u + d * stride
+                    if not walls[v]:
+                        crossings.setdefault(position, []).append((u, v))
+
+        entrances = []
+        run = []
+        for position in list(along) + [None]:
+            if position in crossings:
+                run.append(position)
+                continue
+            # Entrances are kept to positions a whole number of moves from the grid's edge
+            # where possible, as paths between them would otherwise waste part of a move
+            aligned = [p for p in run if p % r == 0] or run
+            if len(run) > LONG_ENTRANCE:
+                picked = [aligned[0], aligned[-1]]
+            elif run:
+                picked = [min(aligned, key=lambda p: abs(p - run[len(run) // 2]))]
+            else:
+                picked = []
+            for p in picked:
+                # The longest crossing at the picked position, which starts a whole number
+                # of moves from the edge, so that crossing the border covers as much ground
+                # as a move anywhere else does
+                entrances.append(min(crossings[p], key=lambda (u, v): (-abs(v - u), u)))
+            run = []
+
+        self.borders[(a, b)] = entrances
+        return entrances
+
+    def cluster_edges(self, c):
+        """
+        Returns {entrance square: [(square, moves), ...]} for cluster c, joining each of its
+        entrance squares to the others it can reach inside c and across the border to the
+        square on the other side.
+        """
+        edges = self.edges.get(c)
+        if edges is not None:
+            return edges
+
+        edges = {}
+        for n in self.neighbour_clusters(c):
+            for u, v in self.border(min(c, n), max(c, n)):
+                inside, outside = (u, v) if c < n else (v, u)
+                edges.setdefault(inside, []).append((outside, 1))
+        entrances = list(edges)
+        for node in entrances:
+            distances = self.search_cluster(node, c)[0]
+            for other in entrances:
+                if other != node and other in distances:
+                    edges[node].append((other, distances[other]))
+
+        self.edges[c] = edges
+        return edges
+
+    def invalidate(self, squares=None):
+        """
+        Forgets what's been worked out about the clusters holding squares, and their
+        neighbours, whose entrances may have changed. Forgets everything if squares is None.
+        """
+        if squares is None:
+            self.borders.clear()
+            self.edges.clear()
+            return
+        for i in squares:
+            c = self.cluster(i)
+            self.edges.pop(c, None)
+            for n in self.neighbour_clusters(c):
+                self.edges.pop(n, None)
+                self.borders.pop((min(c, n), max(c, n)), None)
+
+    def heuristic(self, a, b):
+        return self.grid.moves_between_indexes(a, b, self.moves_per_turn)
+
+    def find_path(self, start, goal, refine=2):
+        """
+        Returns a list of squares from start heading for goal, following a near shortest path
+        refined into squares for only its first refine hops between entrances, and the hops
+        left to refine, starting with the path's last square and ending with goal. The hops
+        left are empty once the path reaches goal. Returns None if goal can't be reached.
+        """
+        if start == goal:
+            return [start], []
+        path = self.search_nearby(start, goal)
+        if path is not None:
+            return path, []
+
+        start_cluster, goal_cluster = self.cluster(start), self.cluster(goal)
+        start_distances, start_came_from = self.search_cluster(start, start_cluster)
+        goal_distances, goal_came_from = self.search_cluster(goal, goal_cluster)
+        to_goal = dict((node, goal_distances[node])
+            for node in self.cluster_edges(goal_cluster) if node in goal_distances)
+
+        def neighbours(node):
+            edges = self.cluster_edges(self.cluster(node)).get(node, [])
+            if node == start:
+                edges = edges + [(n, start_distances[n])
+                    for n in self.cluster_edges(start_cluster) if n in start_distances]
+                if goal in start_distances:
+                    edges.append((goal, start_distances[goal]))
+            if node in to_goal:
+                edges = edges + [(goal, to_goal[node])]
+            return edges
+
+        # Ordered by (f, h, insertion order) like Player.find_path, so that of equally good
+        # entrances the one nearest the goal is expanded first
+        sequence = count()
+        g = { start: 0 }
+        came_from = {}
+        closed = set()
+        h = self.heuristic(start, goal)
+        open_heap = [(h * HEURISTIC_WEIGHT, h, next(sequence), 0, start)]
+        while open_heap:
+            f, h, _, cost, node = heappop(open_heap)
+            if node in closed or cost > g[node]:
+                continue
+            if node == goal:
+                break
+            closed.add(node)
+            self.expansions += 1
+            for n, moves in neighbours(node):
+                if n not in closed and cost + moves < g.get(n, cost + moves + 1):
+                    g[n] = cost + moves
+                    came_from[n] = node
+                    h = self.heuristic(n, goal)
+                    heappush(open_heap,
+                        (cost + moves + h * HEURISTIC_WEIGHT, h, next(sequence), cost + moves, n))
+        else:
+            return None
+
+        hops = [goal]
+        while hops[-1] != start:
+            hops.append(came_from[hops[-1]])
+        hops.reverse()
+        # Moves are reversible, so the searches from start and goal also lead back to them
+        return self.refine_hops(hops, refine, { start: start_came_from, goal: goal_came_from })
+
+    def continue_path(self, hops, refine=2):
+        """
+        Refines the next refine of the hops left by find_path, as find_path does. Doesn't
+        check whether the walls have changed since.
+        """
+        return self.refine_hops(hops, refine, {})
+
+    def refine_hops(self, hops, refine, searches):
+        path = [hops[0]]
+        for a, b in zip(hops, hops[1:])[:refine]:
+            path.extend(self.refine(a, b, searches))
+        hops = hops[refine:]
+        return path, hops if len(hops) > 1 else []
+
+    def refine(self, a, b, searches):
+        """
+        Returns the squares after a up to and including b for a hop between entrances.
+        searches maps squares to the came_from dicts of searches already made from them
+        across their clusters.
+        """
+        if self.cluster(a) != self.cluster(b):
+            # Every other hop is within a cluster, so this one crosses a border
+            return [b]
+        if b in searches:
+            # Walk from a towards b along the search from b
+            came_from = searches[b]
+            squares = []
+            while a != b:
+                a = came_from[a]
+                squares.append(a)
+            return squares
+        came_from = searches.get(a)
+        if came_from is None:
+            came_from = self.search(a, self.bounds(self.cluster(a)), b)[1]
+        squares = [b]
+        while squares[-1] != a:
+            squares.append(came_from[squares[-1]])
+        squares.pop()
+        squares.reverse()
+        return squares
@@ -0,0 +1,240 @@
+"""
+Incremental path planning for a character chasing a target when both move between searches,
+using Moving Target D* Lite (Sun, Yeoh and Koenig, 2010).
+
+The search tree is rooted at the character. When the character moves along its path, the
+part of the tree below its new position is kept and only the rest is searched again. When
+the target moves, the heuristic is corrected with an offset rather than re-keying the open
+list. Squares entering or leaving the avoid set are repaired like edge cost changes in
+D* Lite.
+"""
+from heapq import heappush, heappop
+
+INFINITY = float("inf")
+
+class MovingTargetPlanner(object):
+    """
+    Keeps the search state for one character on one grid between calls to find_path.
+    Squares are referred to by their index in the grid's flat arrays.
+    """
+
+    def __init__(self, grid, moves_per_turn=1):
+        self.grid = grid
+        self.moves_per_turn = moves_per_turn
+        self.expansions = 0
+        self.start = None
+        self.goal = None
+
+    def reset(self, start, goal, blocked):
+        self.wall_version = self.grid.wall_version
+        self.offsets, self.neighbours = self.grid.adjacency(self.moves_per_turn)
+        self.start = start
+        self.goal = goal
+        self.blocked = blocked
+        self.km = 0
+        self.g = {}
+        self.rhs = { start: 0 }
+        self.parent = {}
+        self.children = {}
+        self.open = {}
+        self.open_heap = []
+        self.update_state(start)
+
+    def heuristic(self, a, b):
+        return self.grid.moves_between_indexes(a, b, self.moves_per_turn)
+
+    def key(self, s):
+        v = min(self.g.get(s, INFINITY), self.rhs.get(s, INFINITY))
+        return (v + self.heuristic(s, self.goal) + self.km, v)
+
+    def update_state(self, s):
+        """
+        Keeps s in the open list exactly while it's inconsistent.
+        """
+        if self.g.get(s, INFINITY) != self.rhs.get(s, INFINITY):
+            key = self.key(s)
+            if self.open.get(s) != key:
+                self.open[s] = key
+                heappush(self.open_heap, (key[0], key[1], s))
+        elif s in self.open:
+            del self.open[s]
+
+    def top(self):
+        """
+        Returns the (key, square) with the lowest key in the open list, skipping heap
+        entries which were superseded or removed. Returns (None, None) if it's empty.
+        """
+        heap = self.open_heap
+        while heap:
+            k1, k2, s = heap[0]
+            if self.open.get(s) == (k1, k2):
+                return (k1, k2), s
+            heappop(heap)
+        return None, None
+
+    def best_predecessor(self, s):
+        """
+        Returns (rhs, parent) for s from the g values of the squares which can move onto it.
+        """
+        if s in self.blocked:
+            return INFINITY, None
+        best, best_parent = INFINITY, None
+        g = self.g
+        neighbours = self.neighbours
+        for i in xrange(self.offsets[s], self.offsets[s + 1]):
+            p = neighbours[i]
+            cost = g.get(p, INFINITY) + 1
+            if cost < best:
+                best, best_parent = cost, p
+        return best, best_parent
+
+    def set_parent(self, s, p):
+        """
+        Sets the parent of s in the search tree, keeping the children lookup up to date.
+        """
+        old = self.parent.get(s)
+        if old == p:
+            return
+        if old is not None:
+            self.children[old].discard(s)
+        if p is None:
+            del self.parent[s]
+        else:
+            self.parent[s] = p
+            if p in self.children:
+                self.children[p].add(s)
+            else:
+                self.children[p] = set([s])
+
+    def set_rhs(self, s, rhs, parent):
+        if rhs == INFINITY:
+            self.rhs.pop(s, None)
+        else:
+            self.rhs[s] = rhs
+        self.set_parent(s, parent)
+
+    def update_blocked(self, blocked):
+        """
+        Repairs the values of squares which entered or left the blocked set.
+        """
+        changed = self.blocked ^ blocked
+        self.blocked = blocked
+        for s in changed:
+            if s != self.start:
+                self.set_rhs(s, *self.best_predecessor(s))
+                self.update_state(s)
+
+    def in_tree(self, s):
+        """
+        Checks whether s hangs off the current start in the search tree.
+        """
+        seen = set()
+        while s is not None and s not in seen:
+            if s == self.start:
+                return True
+            seen.add(s)
+            s = self.parent.get(s)
+        return False
+
+    def move_start(self, start):
+        """
+        Re-roots the search tree at start, which must be in it. Squares below start keep their
+        values, since their shortest paths from the old start all ran through it. The rest of
+        the old tree is dropped and, where it borders the kept subtree, reopened.
+        """
+        deleted = []
+        stack = [self.start]
+        while stack:
+            s = stack.pop()
+            deleted.append(s)
+            stack.extend(c for c in self.children.get(s, ()) if c != start)
+
+        for s in deleted:
+            self.g.pop(s, None)
+            self.rhs.pop(s, None)
+            self.open.pop(s, None)
+            self.set_parent(s, None)
+        self.set_parent(start, None)
+        self.start = start
+
+        for s in deleted:
+            self.set_rhs(s, *self.best_predecessor(s))
+            self.update_state(s)
+
+    def compute_path(self):
+        goal = self.goal
+        g, rhs, parent = self.g, self.rhs, self.parent
+        neighbours, offsets = self.neighbours, self.offsets
+        while True:
+            key, u = self.top()
+            if key is None:
+                break
+            if key >= self.key(goal) and rhs.get(goal, INFINITY) == g.get(goal, INFINITY):
+                break
+
+            new_key = self.key(u)
+            if key < new_key:
+                self.open[u] = new_key
+                heappush(self.open_heap, (new_key[0], new_key[1], u))
+                continue
+
+            self.expansions += 1
+            gu, ru = g.get(u, INFINITY), rhs.get(u, INFINITY)
+            del self.open[u]
+            if gu > ru:
+                # Overconsistent: u got cheaper, pass that on to its successors
+                g[u] = ru
+                for i in xrange(offsets[u], offsets[u + 1]):
+                    s = neighbours[i]
+                    if s != self.start and s not in self.blocked and \
+                            rhs.get(s, INFINITY) > ru + 1:
+                        rhs[s] = ru + 1
+                        self.set_parent(s, u)
+                        self.update_state(s)
+            else:
+                # Underconsistent: u got more expensive, so anything reached through it has to
+                # find another way
+                g.pop(u, None)
+                for i in xrange(offsets[u], offsets[u + 1]):
+                    s = neighbours[i]
+                    if s != self.start and parent.get(s) == u:
+                        self.set_rhs(s, *self.best_predecessor(s))
+                        self.update_state(s)
+                self.update_state(u)
+
+    def find_path(self, start_coords, goal_coords, blocked=()):
+        """
+        Returns the shortest list of coordinates from start_coords to goal_coords avoiding
+        the squares with indexes in blocked, or None if there's no such path. The search
+        state carries over from the previous call where possible.
+        """
+        grid = self.grid
+        start = grid.index(start_coords)
+        goal = grid.index(goal_coords)
+        blocked = set(blocked)
+
+        if self.start is None or self.wall_version != grid.wall_version:
+            self.reset(start, goal, blocked)
+        else:
+            if goal != self.goal:
+                self.km += self.heuristic(self.goal, goal)
+                self.goal = goal
+            self.update_blocked(blocked)
+            if start != self.start:
+                if self.in_tree(start):
+                    self.move_start(start)
+                else:
+                    self.reset(start, goal, blocked)
+
+        self.compute_path()
+        if self.g.get(goal, INFINITY) == INFINITY:
+            return None
+
+        cells = grid.coords_table()
+        path = [cells[goal]]
+        s = goal
+        while s != start:
+            s = self.parent[s]
+            path.append(cells[s])
+        path.reverse()
+        return path
@@ -0,0 +1,270 @@
+"""
+Adversarial lookahead for the runner: an iterative deepening alpha-beta search over the
+moves of the runner and the chaser, to pick the runner's move while the chaser is close.
+
+Each tick is two plies, the runner moving first as it does in the game, and the runner is
+caught if the two end a tick on the same square. Apples are eaten at the end of a tick like
+in Game.tick, though none are spawned during the search. Positions are scored for the
+runner by how many moves the chaser needs to reach it around the walls, how many moves the
+runner has left, the apples it has eaten on the way and how near it is to the nearest one
+left.
+
+Searched positions are kept in a TranspositionTable keyed by Zobrist hashes of the
+characters' squares, the apples left and whose move it is, so that positions reached by
+different orders of moves, and by earlier iterations, aren't searched again.
+"""
+import random
+from timeit import default_timer
+
+# Scores, from the runner's side
+CAUGHT = -1000000
+APPLE_EATEN = 50
+CHASER_MOVE = 10
+# Further than this many moves from the chaser counts as safe as any other distance
+SAFE_DISTANCE = 12
+RUNNER_MOVE_LEFT = 3
+APPLE_MOVE = 1
+
+# What a TranspositionTable entry's value is: the position's score, or a bound on it
+EXACT, LOWER, UPPER = 0, 1, 2
+
+class OutOfTime(Exception): pass
+
+
+class TranspositionTable(object):
+    """
+    A fixed number of slots, indexed by the low bits of a position's hash and holding
+    (hash, depth, flag, value, best move, generation) entries. A new entry only replaces one
+    for a different position that was searched deeper if that one is left over from an
+    earlier search.
+    """
+
+    def __init__(self, size_bits=16):
+        self.mask = (1 << size_bits) - 1
+        self.slots = [None] * (1 << size_bits)
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def new_search(self):
+        self.generation += 1
+
+    def get(self, key):
+        entry = self.slots[key & self.mask]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def put(self, key, depth, flag, value, move):
+        i = key & self.mask
+        entry = self.slots[i]
+        if entry is not None and entry[0] != key and entry[1] > depth and \
+                entry[5] == self.generation:
+            return
+        self.slots[i] = (key, depth, flag, value, move, self.generation)
+
+
+class Lookahead(object):
+    """
+    Searches the runner's moves in game. Squares are referred to by their index in the
+    grid's flat arrays.
+    """
+
+    def __init__(self, game, runner_moves_per_turn=2, chaser_moves_per_turn=1, table_bits=16,
+            seed=0):
+        self.game = game
+        self.grid = grid = game.grid
+        self.runner_moves_per_turn = runner_moves_per_turn
+        self.chaser_moves_per_turn = chaser_moves_per_turn
+        rng = random.Random(seed)
+        squares = len(grid.walls)
+        self.runner_keys = [rng.getrandbits(64) for _ in xrange(squares)]
+        self.chaser_keys = [rng.getrandbits(64) for _ in xrange(squares)]
+        self.apple_keys = [rng.getrandbits(64) for _ in xrange(squares)]
+        self.chaser_to_move = rng.getrandbits(64)
+        self.table_bits = table_bits
+        self.table = TranspositionTable(table_bits)
+        self.wall_version = grid.wall_version
+        self.nodes = 0
+        self.depth = 0
+
+    def choose(self, runner, chaser, apples, seconds=0.005, max_depth=20):
+        """
+        Returns the square the runner at runner should move to, searching one tick deeper at
+        a time until seconds have passed or max_depth plies have been searched. apples is a
+        list of the squares of the apples worth going for.
+        """
+        grid = self.grid
+        self.deadline = default_timer() + seconds
+        self.width = grid.size[0]
+        self.cells = grid.coords_table()
+        self.runner_offsets, self.runner_neighbours = grid.adjacency(self.runner_moves_per_turn)
+        self.chaser_offsets, self.chaser_neighbours = grid.adjacency(self.chaser_moves_per_turn)
+        # The chaser's distance fields, one for each square the search puts it on, shared
+        # with the rest of the game for the tick
+        self.fields = {}
+        # Apples left are a bitmask over apple_squares
+        self.apple_squares = []
+        self.apple_bits = {}
+        for coords in apples:
+            i = grid.index(coords)
+            if i not in self.apple_bits:
+                self.apple_bits[i] = 1 << len(self.apple_squares)
+                self.apple_squares.append(i)
+        # Scores depend on the way around the walls
+        if self.wall_version != grid.wall_version:
+            self.table = TranspositionTable(self.table_bits)
+            self.wall_version = grid.wall_version
+        self.table.new_search()
+
+        r, c = grid.index(runner), grid.index(chaser)
+        apples_left = (1 << len(self.apple_squares)) - 1
+        key = self.runner_keys[r] ^ self.chaser_keys[c]
+        for i in self.apple_squares:
+            key ^= self.apple_keys[i]
+
+        move = r
+        self.depth = 0
+        for depth in xrange(2, max_depth + 1, 2):
+            try:
+                value = self.runner_node(r, c, apples_left, key, depth, CAUGHT - 1, -CAUGHT + 1)
+            except OutOfTime:
+                break
+            move = self.table.get(key)[4]
+            self.depth = depth
+            # No point looking further if every move gets the runner caught
+            if value <= CAUGHT:
+                break
+        return self.cells[move]
+
+    def runner_node(self, r, c, apples, key, depth, alpha, beta):
+        self.nodes += 1
+        if not self.nodes & 127 and default_timer() > self.deadline:
+            raise OutOfTime()
+        if depth == 0:
+            return self.evaluate(r, c, apples)
+
+        table = self.table
+        entry = table.get(key)
+        first = None
+        if entry is not None:
+            if entry[1] >= depth:
+                flag, value = entry[2], entry[3]
+                if flag == EXACT or (flag == LOWER and value >= beta) or \
+                        (flag == UPPER and value <= alpha):
+                    return value
+            first = entry[4]
+
+        # Moves away from the chaser first, as they're the likeliest to be best
+        width = self.width
+        cx, cy = c % width, c // width
+        moves = [r] + list(self.runner_neighbours[
+            self.runner_offsets[r]:self.runner_offsets[r + 1]])
+        moves.sort(key=lambda m: -abs(m % width - cx) - abs(m // width - cy))
+        if first is not None:
+            moves.remove(first)
+            moves.insert(0, first)
+
+        runner_keys = self.runner_keys
+        original_alpha = alpha
+        best_value = best_move = None
+        for m in moves:
+            value = self.chaser_node(m, c, apples,
+                key ^ runner_keys[r] ^ runner_keys[m] ^ self.chaser_to_move, depth - 1,
+                alpha, beta)
+            if best_value is None or value > best_value:
+                best_value, best_move = value, m
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        break
+
+        table.put(key, depth, UPPER if best_value <= original_alpha else
+            LOWER if best_value >= beta else EXACT, best_value, best_move)
+        return best_value
+
+    def chaser_node(self, r, c, apples, key, depth, alpha, beta):
+        self.nodes += 1
+        table = self.table
+        entry = table.get(key)
+        first = None
+        if entry is not None:
+            if entry[1] >= depth:
+                flag, value = entry[2], entry[3]
+                if flag == EXACT or (flag == LOWER and value >= beta) or \
+                        (flag == UPPER and value <= alpha):
+                    return value
+            first = entry[4]
+
+        # Moves towards the runner first
+        width = self.width
+        rx, ry = r % width, r // width
+        moves = [c] + list(self.chaser_neighbours[
+            self.chaser_offsets[c]:self.chaser_offsets[c + 1]])
+        moves.sort(key=lambda m: abs(m % width - rx) + abs(m // width - ry))
+        if first is not None:
+            moves.remove(first)
+            moves.insert(0, first)
+
+        chaser_keys, apple_keys, apple_bits = self.chaser_keys, self.apple_keys, self.apple_bits
+        original_beta = beta
+        best_value = best_move = None
+        for m in moves:
+            if m == r:
+                value = CAUGHT
+            else:
+                # The end of the tick, when apples under either character are eaten
+                child_key = key ^ chaser_keys[c] ^ chaser_keys[m] ^ self.chaser_to_move
+                left = apples
+                reward = 0
+                runner_apple = apple_bits.get(r, 0) & left
+                if runner_apple:
+                    left &= ~runner_apple
+                    child_key ^= apple_keys[r]
+                    reward = APPLE_EATEN
+                chaser_apple = apple_bits.get(m, 0) & left
+                if chaser_apple:
+                    left &= ~chaser_apple
+                    child_key ^= apple_keys[m]
+                value = reward + self.runner_node(r, m, left, child_key, depth - 1,
+                    alpha - reward, beta - reward)
+            if best_value is None or value < best_value:
+                best_value, best_move = value, m
+                if value < beta:
+                    beta = value
+                    if alpha >= beta:
+                        break
+
+        table.put(key, depth, LOWER if best_value >= original_beta else
+            UPPER if best_value <= alpha else EXACT, best_value, best_move)
+        return best_value
+
+    def evaluate(self, r, c, apples):
+        moves_between, chaser_moves = self.game.grid.moves_between_indexes, \
+            self.chaser_moves_per_turn
+        # Walls only make the way longer, so there's no need to search around them when the
+        # chaser is too far away even going straight
+        if moves_between(r, c, chaser_moves) >= SAFE_DISTANCE:
+            distance = SAFE_DISTANCE
+        else:
+            field = self.fields.get(c)
+            if field is None:
+                field = self.fields[c] = self.game.distance_field(self.cells[c], chaser_moves)
+            distance = field.distance_to(self.cells[r])
+            if distance is None or distance > SAFE_DISTANCE:
+                distance = SAFE_DISTANCE
+        value = CHASER_MOVE * distance + RUNNER_MOVE_LEFT * (
+            self.runner_offsets[r + 1] - self.runner_offsets[r])
+
+        if apples:
+            moves_per_turn = self.runner_moves_per_turn
+            nearest = None
+            for i, square in enumerate(self.apple_squares):
+                if apples & (1 << i):
+                    moves = moves_between(square, r, moves_per_turn)
+                    if nearest is None or moves < nearest:
+                        nearest = moves
+            value -= APPLE_MOVE * nearest
+        return value
@@ -0,0 +1,177 @@
+"""
+Counters and histograms of where a game spends its time, for profiling the AI.
+
+Nothing is measured unless a game and its players are instrumented, which wraps the methods
+being measured on those instances only. Uninstrumented games run exactly the same code as
+before.
+
+    metrics = instrument(game, [ p_runner, p_chaser ])
+    ...
+    metrics.dump(open("profile.json", "w"))
+"""
+import json
+from math import frexp
+from timeit import default_timer
+
+class Histogram(object):
+    """
+    Summary of a series of values, with counts of them in power of two buckets. Each bucket
+    is keyed by its upper bound and holds the values greater than half of it.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.buckets = {}
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+        if value <= 0:
+            bound = 0
+        else:
+            mantissa, exponent = frexp(value)
+            bound = 2.0 ** (exponent - 1 if mantissa == 0.5 else exponent)
+        self.buckets[bound] = self.buckets.get(bound, 0) + 1
+
+    def mean(self):
+        return float(self.total) / self.count if self.count else 0.0
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.mean(),
+            "min": self.min,
+            "max": self.max,
+            "buckets": [[bound, self.buckets[bound]] for bound in sorted(self.buckets)],
+        }
+
+
+class Metrics(object):
+    """
+    Named counters and histograms. Times are recorded in milliseconds.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, value):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.add(value)
+
+    def timed(self, name, function):
+        """
+        Returns a function calling function and observing how long it took under name.
+        """
+        def timed_function(*args, **kargs):
+            started = default_timer()
+            try:
+                return function(*args, **kargs)
+            finally:
+                self.observe(name, (default_timer() - started) * 1000)
+        return timed_function
+
+    def as_dict(self):
+        return {
+            "counters": dict(self.counters),
+            "histograms": dict((name, h.as_dict()) for name, h in self.histograms.iteritems()),
+        }
+
+    def dump(self, out):
+        """
+        Writes the metrics as JSON to the file out.
+        """
+        json.dump(self.as_dict(), out, indent=2, sort_keys=True)
+        out.write("\n")
+
+
+def instrument(game, players, metrics=None):
+    """
+    Starts measuring game and players into metrics, a new Metrics unless given, which is
+    returned. Metrics are named after the players' characters, e.g. "runner.make_move":
+
+    tick, runner.make_move:
+        Milliseconds taken by each call.
+    runner.find_path.nodes_expanded, runner.find_path.open_set_peak, runner.find_path.length:
+        Per call to find_path which plans a path, rather than carrying on along the one it
+        has. open_set_peak is only seen by searches which fire successors_evaluated.
+    runner.find_path.suspended:
+        Searches which ran out of the player's search_budget or search_time, and were left
+        to carry on next move.
+    runner.replans.<interruption>:
+        Times each of the player's path_interruptions made it plan a new path.
+    refill_apples.placed, refill_apples.full:
+        Apples placed per refill, and refills which ran out of free squares.
+    """
+    if metrics is None:
+        metrics = Metrics()
+
+    game.tick = metrics.timed("tick", game.tick)
+
+    refill_apples = game.refill_apples
+    def measured_refill_apples():
+        before = len(game.apples)
+        refill_apples()
+        metrics.observe("refill_apples.placed", len(game.apples) - before)
+        if len(game.apples) < game.apple_count:
+            metrics.count("refill_apples.full")
+    game.refill_apples = measured_refill_apples
+
+    for player in players:
+        instrument_player(player, metrics)
+    return metrics
+
+def instrument_player(player, metrics):
+    name = type(player.character).__name__.lower()
+    player.make_move = metrics.timed(name + ".make_move", player.make_move)
+
+    open_set_peak = [0]
+    def measure_open_set(open_set, closed_set, character_position, target_coords):
+        open_set_peak[0] = max(open_set_peak[0], len(open_set))
+    player.successors_evaluated += measure_open_set
+
+    find_path = player.find_path
+    def measured_find_path(target_coords):
+        open_set_peak[0] = 0
+        nodes_expanded = player.nodes_expanded
+        followed = player.path
+        path = find_path(target_coords)
+        # Carrying on along the current path, or having nowhere to go, plans nothing
+        if not target_coords or (followed is not None and player.path is followed):
+            return path
+        metrics.observe(name + ".find_path.nodes_expanded",
+            player.nodes_expanded - nodes_expanded)
+        metrics.observe(name + ".find_path.length", len(path))
+        if open_set_peak[0]:
+            metrics.observe(name + ".find_path.open_set_peak", open_set_peak[0])
+        if player.search is not None:
+            metrics.count(name + ".find_path.suspended")
+        return path
+    player.find_path = measured_find_path
+
+    player.path_interruptions[:] = [counted_interruption(metrics,
+        "%s.replans.%s" % (name, interruption.__name__), interruption)
+        for interruption in player.path_interruptions]
+
+def counted_interruption(metrics, name, interruption):
+    def counted():
+        interrupted = interruption()
+        if interrupted:
+            metrics.count(name)
+        return interrupted
+    counted.__name__ = interruption.__name__
+    return counted
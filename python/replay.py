@@ -0,0 +1,340 @@
+"""
+Records games to a compact binary log and plays them back, to reproduce a game exactly
+without running the AI again.
+
+A log holds the game's settings and seed, and for every tick one byte per character for its
+move and the squares of any apples spawned. Every keyframe_interval ticks it also holds a
+keyframe of the whole game state, and it ends with an index of the keyframes, so that any
+tick can be reached by loading the keyframe before it and replaying no more than
+keyframe_interval ticks from there.
+
+    python replay.py game.replay --tick 5000
+
+Walls are recorded as they are when recording starts, so games whose walls change can't be
+replayed.
+"""
+import argparse
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_right
+from runner_chaser import Game, Apple
+
+MAGIC = "RCRP"
+END_MAGIC = "RCRE"
+VERSION = 2
+# magic, version, width, height, win_score, apple_count, shelf life (-1 for the default),
+# whether there's a seed, seed, keyframe interval, wall count
+HEADER = struct.Struct("<4sBHHIHiBQII")
+# tick, runner x, y, chaser x, y, runner score, chaser score, apple count
+KEYFRAME = struct.Struct("<IHHHHIIH")
+# x, y, expiry tick
+APPLE = struct.Struct("<HHi")
+# runner move, chaser move, spawned apple count
+TICK = struct.Struct("<BBH")
+# tick, offset
+INDEX_ENTRY = struct.Struct("<IQ")
+# index offset, keyframe count, ticks, winner, magic
+TRAILER = struct.Struct("<QIIB4s")
+
+WINNERS = [None, "runner", "chaser"]
+
+def encode_move(old, new):
+    """
+    Packs a move of up to 7 squares each way into a byte.
+    """
+    dx = new[0] - old[0]
+    dy = new[1] - old[1]
+    if not (-8 < dx < 8 and -8 < dy < 8):
+        raise ValueError("Cannot record a move from %d, %d to %d, %d" % (
+            old[0], old[1], new[0], new[1]))
+    return (dx + 8) | (dy + 8) << 4
+
+def decode_move(position, move):
+    return (position[0] + (move & 15) - 8, position[1] + (move >> 4) - 8)
+
+def pack_coords(coords):
+    """
+    Packs a list of coordinates as little endian 16 bit pairs.
+    """
+    values = array("H", [v for c in coords for v in c])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tostring()
+
+def unpack_coords(data, offset, count):
+    values = array("H")
+    values.fromstring(data[offset:offset + 4 * count])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return zip(values[::2], values[1::2])
+
+def hook_tick(game, recorded):
+    """
+    Wraps game's tick so that recorded(winner) is called after every tick, winner being 1
+    if the tick won the game for the runner, 2 if it did for the chaser and otherwise None.
+    """
+    tick = game.tick
+    def recorded_tick():
+        winner = None
+        try:
+            tick()
+        except game.Win:
+            winner = 1
+            raise
+        except game.Lose:
+            winner = 2
+            raise
+        finally:
+            recorded(winner)
+    game.tick = recorded_tick
+
+
+class Recorder(object):
+    """
+    Records game to out, a file opened for binary writing, from its current state onwards.
+    Recording hooks into the game's tick and add_apple, so it carries on however the game
+    is played. Call close once the game is over to write the keyframe index.
+    """
+
+    def __init__(self, out, game, seed=None, keyframe_interval=1000):
+        self.out = out
+        self.game = game
+        self.keyframe_interval = keyframe_interval
+        self.offset = 0
+        self.keyframes = []
+        self.spawns = []
+        self.winner = None
+        self.positions = (game.runner.position, game.chaser.position)
+
+        walls = game.grid.wall_coords()
+        self.write(HEADER.pack(MAGIC, VERSION, game.grid.size[0], game.grid.size[1],
+            game.win_score, game.apple_count,
+            -1 if game.apple_shelf_life is None else game.apple_shelf_life,
+            seed is not None, seed or 0, keyframe_interval, len(walls)))
+        self.write(pack_coords(walls))
+        self.write_keyframe()
+
+        add_apple = game.add_apple
+        def recorded_add_apple(apple):
+            self.spawns.append(apple.position)
+            add_apple(apple)
+        game.add_apple = recorded_add_apple
+
+        def recorded(winner):
+            if winner:
+                self.winner = winner
+            self.record_tick()
+        hook_tick(game, recorded)
+
+    def write(self, data):
+        self.out.write(data)
+        self.offset += len(data)
+
+    def write_keyframe(self):
+        game = self.game
+        self.keyframes.append((game.ticks, self.offset))
+        apples = list(game.apples)
+        self.write(KEYFRAME.pack(game.ticks, game.runner.position[0], game.runner.position[1],
+            game.chaser.position[0], game.chaser.position[1], game.runner.score,
+            game.chaser.score, len(apples)))
+        self.write("".join(APPLE.pack(a.position[0], a.position[1], a.expires)
+            for a in apples))
+
+    def record_tick(self):
+        game = self.game
+        runner, chaser = self.positions
+        self.positions = (game.runner.position, game.chaser.position)
+        self.write(TICK.pack(encode_move(runner, game.runner.position),
+            encode_move(chaser, game.chaser.position), len(self.spawns)))
+        if self.spawns:
+            self.write(pack_coords(self.spawns))
+            del self.spawns[:]
+        if game.ticks % self.keyframe_interval == 0:
+            self.write_keyframe()
+
+    def close(self):
+        index_offset = self.offset
+        self.write("".join(INDEX_ENTRY.pack(tick, offset) for tick, offset in self.keyframes))
+        self.write(TRAILER.pack(index_offset, len(self.keyframes), self.game.ticks,
+            self.winner or 0, END_MAGIC))
+        self.out.close()
+
+
+class ReplayGame(Game):
+    """
+    A Game rebuilt from a keyframe, which places new apples where the log says they were
+    placed rather than at random.
+    """
+
+    def __init__(self, replay, keyframe_offset):
+        (tick, runner_x, runner_y, chaser_x, chaser_y, runner_score, chaser_score,
+            apple_count) = KEYFRAME.unpack_from(replay.data, keyframe_offset)
+        super(ReplayGame, self).__init__(replay.grid_size, (runner_x, runner_y),
+            (chaser_x, chaser_y), replay.win_score, replay.walls, apple_count=0,
+            apple_shelf_life=replay.apple_shelf_life)
+        self.apple_count = replay.apple_count
+        self.ticks = tick
+        self.runner.score = runner_score
+        self.chaser.score = chaser_score
+        self.winner = None
+        # The spawns of the tick being replayed, last first
+        self.spawns = []
+
+        offset = keyframe_offset + KEYFRAME.size
+        for _ in xrange(apple_count):
+            x, y, expires = APPLE.unpack_from(replay.data, offset)
+            self.add_apple(Apple((x, y), expires - tick, tick))
+            offset += APPLE.size
+
+    def spawn_coords(self, free):
+        return self.spawns.pop()
+
+
+class Replay(object):
+    """
+    A recorded game, read from the bytes of a log. Logs which were never closed, because the
+    recording was cut short, are read up to their last complete tick.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        (magic, version, width, height, self.win_score, self.apple_count, shelf_life,
+            has_seed, seed, self.keyframe_interval, wall_count) = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a version %d replay log" % VERSION)
+        self.grid_size = (width, height)
+        self.apple_shelf_life = None if shelf_life == -1 else shelf_life
+        self.seed = seed if has_seed else None
+
+        self.walls = unpack_coords(data, HEADER.size, wall_count)
+        self.start = HEADER.size + 4 * wall_count
+
+        index_offset, keyframe_count, self.ticks, winner, end_magic = \
+            TRAILER.unpack_from(data, len(data) - TRAILER.size)
+        if end_magic == END_MAGIC:
+            self.winner = WINNERS[winner]
+            entries = [INDEX_ENTRY.unpack_from(data, index_offset + i * INDEX_ENTRY.size)
+                for i in xrange(keyframe_count)]
+            self.keyframe_ticks = [tick for tick, offset in entries]
+            self.keyframe_offsets = [offset for tick, offset in entries]
+        else:
+            self.scan()
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+    def keyframe_size(self, offset):
+        return KEYFRAME.size + APPLE.size * KEYFRAME.unpack_from(self.data, offset)[7]
+
+    def tick_size(self, offset):
+        return TICK.size + 4 * TICK.unpack_from(self.data, offset)[2]
+
+    def scan(self):
+        """
+        Finds the keyframes and the last complete tick by reading through the whole log.
+        """
+        self.winner = None
+        self.keyframe_ticks = []
+        self.keyframe_offsets = []
+        self.ticks = tick = 0
+        offset = self.start
+        end = len(self.data)
+        while True:
+            if tick % self.keyframe_interval == 0:
+                if offset + KEYFRAME.size > end or offset + self.keyframe_size(offset) > end:
+                    break
+                self.keyframe_ticks.append(tick)
+                self.keyframe_offsets.append(offset)
+                offset += self.keyframe_size(offset)
+            if offset + TICK.size > end or offset + self.tick_size(offset) > end:
+                break
+            offset += self.tick_size(offset)
+            tick += 1
+            self.ticks = tick
+
+    def seek(self, tick):
+        """
+        Returns a ReplayGame in the state it was in after tick ticks.
+        """
+        return self.seek_offset(tick)[0]
+
+    def seek_offset(self, tick):
+        """
+        Returns a ReplayGame in the state it was in after tick ticks and the offset of the
+        tick after that.
+        """
+        if not 0 <= tick <= self.ticks:
+            raise ValueError("Tick %d is not in this replay of %d ticks" % (tick, self.ticks))
+        i = bisect_right(self.keyframe_ticks, tick) - 1
+        offset = self.keyframe_offsets[i]
+        game = ReplayGame(self, offset)
+        offset += self.keyframe_size(offset)
+        for _ in xrange(tick - game.ticks):
+            offset = self.replay_tick(game, offset)
+        return game, offset
+
+    def play(self, start=0, stop=None):
+        """
+        Yields the game after every tick from start until stop, or the end of the replay. The
+        same ReplayGame is yielded each time, changed by one tick.
+        """
+        stop = self.ticks if stop is None else min(stop, self.ticks)
+        game, offset = self.seek_offset(start)
+        yield game
+        while game.ticks < stop:
+            offset = self.replay_tick(game, offset)
+            yield game
+
+    def replay_tick(self, game, offset):
+        """
+        Applies the tick recorded at offset to game and returns the offset of the next tick,
+        skipping any keyframe in between. A log cut short may have lost the keyframe after its
+        last tick, so that one is never read.
+        """
+        data = self.data
+        runner_move, chaser_move, spawn_count = TICK.unpack_from(data, offset)
+        offset += TICK.size
+        game.spawns = unpack_coords(data, offset, spawn_count)
+        game.spawns.reverse()
+        offset += 4 * spawn_count
+
+        game.runner.position = decode_move(game.runner.position, runner_move)
+        game.chaser.position = decode_move(game.chaser.position, chaser_move)
+        try:
+            game.tick()
+        except game.Win:
+            game.winner = "runner"
+        except game.Lose:
+            game.winner = "chaser"
+
+        if game.ticks % self.keyframe_interval == 0 and game.ticks < self.ticks:
+            offset += self.keyframe_size(offset)
+        return offset
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show the state of a recorded game.")
+    parser.add_argument("log", help="replay log written by a Recorder")
+    parser.add_argument("--tick", type=int, default=None,
+        help="tick to show the game at, defaults to the end")
+    args = parser.parse_args(argv)
+
+    started = time.time()
+    replay = Replay.load(args.log)
+    tick = replay.ticks if args.tick is None else args.tick
+    game = replay.seek(tick)
+    elapsed = time.time() - started
+
+    print "%dx%d grid, seed %s, %d ticks, winner %s" % (replay.grid_size[0],
+        replay.grid_size[1], replay.seed, replay.ticks, replay.winner)
+    print "Tick %d: runner at %d, %d with %d, chaser at %d, %d with %d, %d apples" % (
+        game.ticks, game.runner.position[0], game.runner.position[1], game.runner.score,
+        game.chaser.position[0], game.chaser.position[1], game.chaser.score, len(game.apples))
+    print "Loaded and sought in %.1fms" % (elapsed * 1000)
+
+if __name__ == "__main__":
+    main()
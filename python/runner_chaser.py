@@ -1,11 +1,19 @@
-import pygame
 from abc import ABCMeta, abstractmethod
 from time import sleep
-from random import randint, choice
+from random import randint, choice, Random
 from math import ceil
-from numpy import interp
+from heapq import heappush, heappop
+from itertools import count
+from array import array
+from collections import OrderedDict
 from pprint import pprint
+from timeit import default_timer
 from events import Event
+from incremental import MovingTargetPlanner
+from jps import JumpPoints
+from hierarchical import ClusterGraph
+from connectivity import Components
+from lookahead import Lookahead
 
 def enum(*sequential, **named):
     """
@@ -23,6 +31,7 @@ class Character(object):
     """
     
     __metaclass__ = ABCMeta
+    __slots__ = ("position", "colour")
     
     def __init__(self, position, colour):
         """
@@ -56,6 +65,7 @@ class MovingCharacter(Character):
     """
     
     __metaclass__ = ABCMeta
+    __slots__ = ("max_moves_per_turn",)
     
     class IllegalMove(Exception): pass
     
@@ -112,12 +122,23 @@ class Chaser(MovingCharacter, Score):
     
 class Apple(Character):
     
-    def __init__(self, position, shelf_life=160):
+    __slots__ = ("expires",)
+    
+    def __init__(self, position, shelf_life=160, tick=0):
+        """
+        Parameters:
+        tick:
+            The game tick the apple appears at. It goes off once the game ticks past
+            tick + shelf_life.
+        """
         super(Apple, self).__init__(position, (0, 255, 0))
-        self.shelf_life = shelf_life
+        self.expires = tick + shelf_life
         
-    def decrease_shelf_life(self):
-        self.shelf_life -= 1
+    def shelf_life(self, tick):
+        """
+        Returns how many more ticks the apple lasts at the given game tick.
+        """
+        return self.expires - tick
     
     
 class Wall(Character):
@@ -129,12 +150,257 @@ class Wall(Character):
         self.orientation = orientation
         
         
+class GridOverlay(object):
+    """
+    Transient set of coordinates to avoid, layered over a Grid's walls. Membership is a single
+    bytearray lookup and clearing only touches the cells which were added.
+    """
+
+    def __init__(self, grid, coords=()):
+        self.grid = grid
+        self.mask = bytearray(grid.size[0] * grid.size[1])
+        self.indexes = []
+        self.update(coords)
+
+    def add(self, coords):
+        if not self.grid.contains_coords(coords):
+            return
+        i = self.grid.index(coords)
+        if not self.mask[i]:
+            self.mask[i] = 1
+            self.indexes.append(i)
+
+    def update(self, coords):
+        for c in coords:
+            self.add(c)
+
+    def clear(self):
+        for i in self.indexes:
+            self.mask[i] = 0
+        self.indexes = []
+
+    def __contains__(self, coords):
+        return self.grid.contains_coords(coords) and self.mask[self.grid.index(coords)] == 1
+
+    def __iter__(self):
+        return (self.grid.coords_at(i) for i in self.indexes)
+
+    def __len__(self):
+        return len(self.indexes)
+
+
+class PathCache(object):
+    """
+    Least recently used cache of paths, as tuples of coordinates, keyed by where they start
+    and end, the move radius they were found for, the wall_version of the grid and the set of
+    square indexes they had to avoid. Keying on the walls and avoided squares means a path
+    is never handed out once something has been put in its way.
+    
+    Any part of a shortest path is a shortest path too, so a path is also handed out, from
+    the right place onwards, for a start anywhere along it.
+    """
+
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self.paths = OrderedDict()
+        # Maps a key starting partway along a cached path to (key of the path, offset)
+        self.suffixes = {}
+        self.hits = 0
+        self.suffix_hits = 0
+        self.misses = 0
+
+    def get(self, start, target, radius, wall_version, avoid=frozenset()):
+        """
+        Returns a cached path from start to target, or None.
+        """
+        route = (target, radius, wall_version, avoid)
+        key = (start,) + route
+        path = self.paths.pop(key, None)
+        if path is not None:
+            self.paths[key] = path
+            self.hits += 1
+            return path
+        
+        suffix = self.suffixes.get(key)
+        if suffix is not None:
+            path_key, offset = suffix
+            path = self.paths[path_key] = self.paths.pop(path_key)
+            self.suffix_hits += 1
+            return path[offset:]
+        
+        self.misses += 1
+        return None
+
+    def put(self, path, radius, wall_version, avoid=frozenset()):
+        """
+        Caches path, a list of coordinates from its start to its target.
+        """
+        route = (path[-1], radius, wall_version, avoid)
+        key = (path[0],) + route
+        if key in self.paths:
+            self.forget(key, self.paths.pop(key))
+        
+        path = self.paths[key] = tuple(path)
+        for offset in xrange(1, len(path) - 1):
+            self.suffixes[(path[offset],) + route] = (key, offset)
+        
+        while len(self.paths) > self.capacity:
+            self.forget(*self.paths.popitem(last=False))
+
+    def forget(self, key, path):
+        """
+        Drops the suffixes pointing into a path which is leaving the cache.
+        """
+        route = key[1:]
+        for offset in xrange(1, len(path) - 1):
+            suffix_key = (path[offset],) + route
+            if self.suffixes.get(suffix_key, (None,))[0] == key:
+                del self.suffixes[suffix_key]
+
+    def clear(self):
+        self.paths.clear()
+        self.suffixes.clear()
+
+    def stats(self):
+        return { "hits": self.hits, "suffix_hits": self.suffix_hits, "misses": self.misses,
+            "size": len(self.paths) }
+
+
 class Grid(object):
 
     Direction = enum("NORTH", "EAST", "SOUTH", "WEST")
 
-    def __init__(self, size):
+    def __init__(self, size, walls=()):
+        """
+        Parameters:
+        size:
+            Tuple (width, height) depicting the amount of squares in each direction.
+        walls:
+            Iterable of (x, y) tuples depicting squares which can't be moved onto.
+        """
         self.size = size
+        # One byte per square, indexed by y * width + x, set to 1 for walls.
+        self.walls = bytearray(size[0] * size[1])
+        # Bumped whenever the wall layout changes so that anything derived from it can tell
+        # when it's out of date.
+        self.wall_version = 0
+        self.adjacency_tables = {}
+        self.cluster_graphs = {}
+        self.component_labels = {}
+        self.cells = None
+        self.path_cache = PathCache()
+        self.set_walls(walls)
+
+    def index(self, coords):
+        """
+        Returns the position of coords within the grid's flat arrays.
+        """
+        return coords[1] * self.size[0] + coords[0]
+
+    def coords_at(self, index):
+        """
+        Returns the coordinates for a position within the grid's flat arrays.
+        """
+        return (index % self.size[0], index // self.size[0])
+
+    def is_wall(self, coords):
+        return self.walls[self.index(coords)] == 1
+
+    def add_wall(self, coords):
+        self.walls[self.index(coords)] = 1
+        self.walls_changed([self.index(coords)])
+
+    def remove_wall(self, coords):
+        self.walls[self.index(coords)] = 0
+        self.walls_changed([self.index(coords)])
+
+    def set_walls(self, walls):
+        """
+        Replaces the current wall layout with the given coordinates.
+        """
+        self.walls[:] = bytearray(len(self.walls))
+        for coords in walls:
+            self.walls[self.index(coords)] = 1
+        self.walls_changed()
+
+    def walls_changed(self, indexes=None):
+        """
+        Parameters:
+        indexes:
+            The squares whose walls changed, if known. ClusterGraphs only forget the clusters
+            around them rather than everything, and Components only relabel the components
+            they touch.
+        """
+        self.wall_version += 1
+        self.adjacency_tables.clear()
+        for graph in self.cluster_graphs.itervalues():
+            graph.invalidate(indexes)
+        for components in self.component_labels.itervalues():
+            components.invalidate(indexes)
+
+    def coords_table(self):
+        """
+        Returns a list of coordinate tuples indexed like the grid's flat arrays, so that code
+        working with indexes can get coordinates without building new tuples.
+        """
+        if self.cells is None:
+            self.cells = [(x, y) for y in xrange(self.size[1]) for x in xrange(self.size[0])]
+        return self.cells
+
+    def adjacency(self, radius=1):
+        """
+        Returns the neighbour table for moves of up to radius squares as a pair of arrays
+        (offsets, neighbours). The indexes of the squares reachable in one move from square i
+        are neighbours[offsets[i]:offsets[i + 1]], in the same order as
+        surrounding_valid_coords returns them. Tables are built on first use and thrown away
+        when the walls change.
+        """
+        table = self.adjacency_tables.get(radius)
+        if table is not None:
+            return table
+        
+        width, height = self.size
+        walls = self.walls
+        offsets = array('i', [0])
+        neighbours = array('i')
+        for y in xrange(height):
+            for x in xrange(width):
+                for i in xrange(1, radius + 1):
+                    if x + i < width and not walls[y * width + x + i]:
+                        neighbours.append(y * width + x + i)
+                    if x - i >= 0 and not walls[y * width + x - i]:
+                        neighbours.append(y * width + x - i)
+                    if y + i < height and not walls[(y + i) * width + x]:
+                        neighbours.append((y + i) * width + x)
+                    if y - i >= 0 and not walls[(y - i) * width + x]:
+                        neighbours.append((y - i) * width + x)
+                offsets.append(len(neighbours))
+        
+        table = self.adjacency_tables[radius] = (offsets, neighbours)
+        return table
+
+    def cluster_graph(self, radius=1):
+        """
+        Returns the ClusterGraph for moves of up to radius squares. Unlike the adjacency
+        tables it's kept when the walls change, forgetting only the clusters around them.
+        """
+        graph = self.cluster_graphs.get(radius)
+        if graph is None:
+            graph = self.cluster_graphs[radius] = ClusterGraph(self, radius)
+        return graph
+
+    def components(self, radius=1):
+        """
+        Returns the Components for moves of up to radius squares, which are kept up to date
+        as the walls change.
+        """
+        components = self.component_labels.get(radius)
+        if components is None:
+            components = self.component_labels[radius] = Components(self, radius)
+        return components
+
+    def wall_coords(self):
+        return [self.coords_at(i) for i, wall in enumerate(self.walls) if wall]
         
     def contains_coords(self, coords):
         """
@@ -155,25 +421,20 @@ class Grid(object):
         ]
         return sorted(directions, key=lambda d: d[1])[0]
         
-    def surrounding_valid_coords(self, coords, radius=1, avoid_set=set()):
+    def surrounding_valid_coords(self, coords, radius=1, avoid_set=None):
         """
-        Returns all valid coordinates in a straight line within the given radius.
+        Returns all valid coordinates in a straight line within the given radius. Walls are
+        never valid, and neither is anything in avoid_set (a GridOverlay or set of coordinates).
         """
-        for i in WALLS:
-            avoid_set.add(i)
+        offsets, neighbours = self.adjacency(radius)
+        cells = self.coords_table()
+        i = self.index(coords)
         
         valid_coords = []
-        for i in xrange(radius):
-            functions = (
-                lambda c: (c[0] + 1 + i, c[1]),
-                lambda c: (c[0] - (1 + i), c[1]),
-                lambda c: (c[0], c[1] + 1 + i),
-                lambda c: (c[0], c[1] - (1 + i))
-            )
-            for f in functions:
-                c = f(coords)
-                if self.contains_coords(c) and c not in avoid_set:
-                    valid_coords.append(c)
+        for j in xrange(offsets[i], offsets[i + 1]):
+            c = cells[neighbours[j]]
+            if avoid_set is None or c not in avoid_set:
+                valid_coords.append(c)
                     
         return valid_coords
     
@@ -185,6 +446,25 @@ class Grid(object):
         xdiff = abs(a[0] - b[0])
         ydiff = abs(a[1] - b[1])
         return ceil(float(xdiff + ydiff) / float(moves_per_turn))
+
+    @staticmethod
+    def moves_between(a, b, moves_per_turn=1):
+        """
+        Calculates the amount of moves Grid.next_pos takes to get from a to b. Each move covers
+        up to moves_per_turn squares along a single axis, so the axes are counted separately.
+        """
+        xdiff = abs(a[0] - b[0])
+        ydiff = abs(a[1] - b[1])
+        return (xdiff + moves_per_turn - 1) // moves_per_turn + \
+            (ydiff + moves_per_turn - 1) // moves_per_turn
+
+    def moves_between_indexes(self, a, b, moves_per_turn=1):
+        """
+        Grid.moves_between for two square indexes.
+        """
+        width = self.size[0]
+        return (abs(a % width - b % width) + moves_per_turn - 1) // moves_per_turn + \
+            (abs(a // width - b // width) + moves_per_turn - 1) // moves_per_turn
         
     @staticmethod
     def direction(a, b):
@@ -279,51 +559,266 @@ class Grid(object):
         return tuple(pos)
 
 
+class FreeCells(object):
+    """
+    The squares of a grid which aren't walls and haven't been taken, kept in an array with
+    each square's slot in it so that squares can be taken, given back and picked at random
+    in constant time. Build a new one when the walls change.
+    """
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.wall_version = grid.wall_version
+        walls = grid.walls
+        self.cells = array("i", (i for i in xrange(len(walls)) if not walls[i]))
+        self.slots = array("i", [-1]) * len(walls)
+        for slot, i in enumerate(self.cells):
+            self.slots[i] = slot
+
+    def add(self, coords):
+        i = self.grid.index(coords)
+        if self.slots[i] == -1 and not self.grid.walls[i]:
+            self.slots[i] = len(self.cells)
+            self.cells.append(i)
+
+    def discard(self, coords):
+        i = self.grid.index(coords)
+        slot = self.slots[i]
+        if slot != -1:
+            # Fill the gap with the last square
+            last = self.cells.pop()
+            if last != i:
+                self.cells[slot] = last
+                self.slots[last] = slot
+            self.slots[i] = -1
+
+    def choice(self, randint):
+        """
+        Returns the coordinates of a free square picked with randint, a function like
+        random.randint.
+        """
+        return self.grid.coords_at(self.cells[randint(0, len(self.cells) - 1)])
+
+    def __contains__(self, coords):
+        return self.slots[self.grid.index(coords)] != -1
+
+    def __len__(self):
+        return len(self.cells)
+
+
+class AppleIndex(object):
+    """
+    The apples on the grid, indexed by their square and by square buckets of bucket_size so
+    that collisions are dictionary lookups and nearby apples can be found without looking
+    at all of them. Iterates over the apples in the order they were added.
+    """
+
+    def __init__(self, grid_size, bucket_size=8):
+        self.grid_size = grid_size
+        self.bucket_size = bucket_size
+        self.buckets_across = (grid_size[0] + bucket_size - 1) // bucket_size
+        self.buckets_down = (grid_size[1] + bucket_size - 1) // bucket_size
+        # Maps each apple to the order it was added in
+        self.apples = OrderedDict()
+        self.squares = {}
+        self.buckets = {}
+        self.added = count()
+
+    def bucket(self, coords):
+        return (coords[0] // self.bucket_size, coords[1] // self.bucket_size)
+
+    def add(self, apple):
+        self.apples[apple] = next(self.added)
+        self.squares.setdefault(apple.position, []).append(apple)
+        self.buckets.setdefault(self.bucket(apple.position), []).append(apple)
+
+    def remove(self, apple):
+        del self.apples[apple]
+        for index, key in ((self.squares, apple.position),
+                (self.buckets, self.bucket(apple.position))):
+            apples = index[key]
+            apples.remove(apple)
+            if not apples:
+                del index[key]
+
+    def at(self, coords):
+        """
+        Returns the apples on the square at coords.
+        """
+        return tuple(self.squares.get(coords, ()))
+
+    def nearest(self, coords, moves_per_turn, distance, limit=None):
+        """
+        Returns a list of (distance, apple) in order of distance, ties going to the apple
+        added first. distance is a function returning the amount of moves to an apple, or
+        None to leave it out, which mustn't be less than the moves needed as the crow flies.
+        Buckets are searched in rings outwards from coords, stopping once limit apples are
+        found and nothing further out could be closer.
+        """
+        size = self.bucket_size
+        cx, cy = self.bucket(coords)
+        rings = max(cx, cy, self.buckets_across - 1 - cx, self.buckets_down - 1 - cy)
+        found = []
+        for ring in xrange(rings + 1):
+            if limit is not None and len(found) >= limit:
+                # Every square in this ring is at least this many moves away
+                closest = ((ring - 1) * size + moves_per_turn) // moves_per_turn
+                if found[limit - 1][0] < closest:
+                    break
+            
+            if ring == 0:
+                buckets = [(cx, cy)]
+            else:
+                buckets = [(x, y) for x in xrange(cx - ring, cx + ring + 1)
+                    for y in (cy - ring, cy + ring)]
+                buckets += [(x, y) for x in (cx - ring, cx + ring)
+                    for y in xrange(cy - ring + 1, cy + ring)]
+            for bucket in buckets:
+                for apple in self.buckets.get(bucket, ()):
+                    d = distance(apple)
+                    if d is not None:
+                        found.append((d, self.apples[apple], apple))
+            found.sort()
+        
+        return [(d, apple) for d, added, apple in found[:limit]]
+
+    def __iter__(self):
+        return iter(self.apples)
+
+    def __len__(self):
+        return len(self.apples)
+
+    def __contains__(self, apple):
+        return apple in self.apples
+
+
 class Game(object):
 
     class Lose(Exception): pass
     class Win(Exception): pass
 
-    def __init__(self, grid_size, runner_start_pos, chaser_start_pos, win_score=100):
-        self.grid = Grid(grid_size)
+    def __init__(self, grid_size, runner_start_pos, chaser_start_pos, win_score=100, walls=(),
+            rng=None, apple_count=None, apple_shelf_life=None):
+        """
+        Parameters:
+        rng:
+            random.Random instance to place apples with. Defaults to the random module's
+            global generator.
+        apple_count:
+            Amount of apples kept on the grid. Defaults to APPLE_COUNT.
+        apple_shelf_life:
+            Ticks an apple lasts before it goes off. Defaults to Apple's default.
+        """
+        self.randint = rng.randint if rng is not None else randint
+        self.apple_count = apple_count if apple_count is not None else APPLE_COUNT
+        self.apple_shelf_life = apple_shelf_life
+        self.grid = Grid(grid_size, walls)
         self.runner = Runner(runner_start_pos, (0, 0, 255), 2)
         self.chaser = Chaser(chaser_start_pos, (255, 0, 0))
-        self.apples = []
+        self.apples = AppleIndex(grid_size)
+        # Heap of (expiry tick, order added, apple), including apples which have been eaten
+        self.apple_expiry = []
+        self.apple_seq = count()
+        self.free = FreeCells(self.grid)
+        self.ticks = 0
+        self.distance_fields = {}
         self.refill_apples()
         self.wall = None
         self.win_score = win_score
         
-    def __random_coords(self):
-        return (randint(0, self.grid.size[0] - 1),
-            randint(0, self.grid.size[1] - 1))
+    def free_cells(self):
+        """
+        Returns the FreeCells of squares with no wall or apple on them, rebuilt if the walls
+        have changed since they were last asked for.
+        """
+        if self.free.wall_version != self.grid.wall_version:
+            self.free = FreeCells(self.grid)
+            for apple in self.apples:
+                self.free.discard(apple.position)
+        return self.free
         
     def refill_apples(self):
-        while len(self.apples) < APPLE_COUNT:
-            coords = self.__random_coords()
-            if coords not in WALLS:
-                self.apples.append(Apple(coords))
+        """
+        Places apples on random free squares, other than the characters', until there are
+        apple_count of them or there's nowhere left to put one.
+        """
+        free = self.free_cells()
+        occupied = [c.position for c in (self.runner, self.chaser) if c.position in free]
+        for coords in occupied:
+            free.discard(coords)
+        
+        while len(self.apples) < self.apple_count and len(free):
+            coords = self.spawn_coords(free)
+            if self.apple_shelf_life is None:
+                apple = Apple(coords, tick=self.ticks)
+            else:
+                apple = Apple(coords, self.apple_shelf_life, self.ticks)
+            self.add_apple(apple)
+        
+        for coords in occupied:
+            free.add(coords)
+        
+    def spawn_coords(self, free):
+        """
+        Picks the square for a new apple from free, a FreeCells.
+        """
+        return free.choice(self.randint)
+        
+    def add_apple(self, apple):
+        self.apples.add(apple)
+        self.free_cells().discard(apple.position)
+        heappush(self.apple_expiry, (apple.expires, next(self.apple_seq), apple))
+        
+    def remove_apple(self, apple):
+        self.apples.remove(apple)
+        if not self.apples.at(apple.position):
+            self.free_cells().add(apple.position)
+        
+    def expired_apples(self):
+        """
+        Pops the apples which have gone off by the current tick from the expiry heap.
+        """
+        expired = []
+        heap = self.apple_expiry
+        while heap and heap[0][0] < self.ticks:
+            apple = heappop(heap)[2]
+            if apple in self.apples:
+                expired.append(apple)
+        return expired
+        
+    def distance_field(self, coords, moves_per_turn=1):
+        """
+        Returns the DistanceField from coords. Fields are shared by everything asking for the
+        same one during a tick and thrown away when the game ticks.
+        """
+        key = (coords, moves_per_turn)
+        field = self.distance_fields.get(key)
+        if field is None or field.wall_version != self.grid.wall_version:
+            field = self.distance_fields[key] = DistanceField(self.grid, coords, moves_per_turn)
+        return field
         
     def tick(self):
+        self.ticks += 1
+        self.distance_fields.clear()
+        
         if self.chaser.position == self.runner.position:
             raise Game.Lose("The runner was caught by the chaser.")
         
         eaten_apples = []
-        for apple in self.apples:
-            if self.runner.position == apple.position:
-                self.runner.increase_score()
-                eaten_apples.append(apple)
-            elif self.chaser.position == apple.position:
-                self.chaser.increase_score()
-                eaten_apples.append(apple)
-            apple.decrease_shelf_life()
-            if apple.shelf_life < 0:
-                eaten_apples.append(apple)
+        for apple in self.apples.at(self.runner.position):
+            self.runner.increase_score()
+            eaten_apples.append(apple)
+        for apple in self.apples.at(self.chaser.position):
+            self.chaser.increase_score()
+            eaten_apples.append(apple)
+        
+        eaten_apples.extend(self.expired_apples())
         
         for apple in eaten_apples:
             # Sometimes both the runner and the chaser are on the same apple, so they appear in
             # eaten_apples twice.
             if apple in self.apples:
-                self.apples.remove(apple)
+                self.remove_apple(apple)
             
         self.refill_apples()
         
@@ -333,8 +828,108 @@ class Game(object):
             raise Game.Lose("The chaser ate %d apples." % self.win_score)
         
 
+class HeuristicTable(object):
+    """
+    Lookup table of Grid.moves_between for a fixed target, stored per axis so that building
+    it costs O(width + height) and each lookup is two list indexes.
+    """
+
+    def __init__(self, grid_size, target, moves_per_turn=1):
+        self.target = target
+        self.moves_per_turn = moves_per_turn
+        self.x_moves = [(abs(x - target[0]) + moves_per_turn - 1) // moves_per_turn
+            for x in xrange(grid_size[0])]
+        self.y_moves = [(abs(y - target[1]) + moves_per_turn - 1) // moves_per_turn
+            for y in xrange(grid_size[1])]
+
+    def matches(self, target, moves_per_turn):
+        return self.target == target and self.moves_per_turn == moves_per_turn
+
+    def moves_from(self, coords):
+        return self.x_moves[coords[0]] + self.y_moves[coords[1]]
+
+
+class DistanceField(object):
+    """
+    The amount of moves needed to get from a source square to every other square, found with
+    a breadth first search which goes around walls. The search only goes as far as the
+    squares asked about so far, a layer at a time. Squares not reached yet are -1.
+    """
+
+    def __init__(self, grid, source, moves_per_turn=1):
+        self.grid = grid
+        self.source = source
+        self.moves_per_turn = moves_per_turn
+        self.wall_version = grid.wall_version
+        
+        self.distances = array('i', [-1]) * len(grid.walls)
+        i = grid.index(source)
+        self.distances[i] = 0
+        self.frontier = [i]
+        self.depth = 0
+
+    def search_until(self, i):
+        """
+        Carries on the search until square i is reached or there's nothing left to reach.
+        """
+        distances = self.distances
+        if distances[i] >= 0 or not self.frontier:
+            return
+        
+        offsets, neighbours = self.grid.adjacency(self.moves_per_turn)
+        frontier = self.frontier
+        d = self.depth
+        while frontier and distances[i] < 0:
+            d += 1
+            next_frontier = []
+            for u in frontier:
+                for v in neighbours[offsets[u]:offsets[u + 1]]:
+                    if distances[v] < 0:
+                        distances[v] = d
+                        next_frontier.append(v)
+            frontier = next_frontier
+        self.frontier = frontier
+        self.depth = d
+
+    def distance_to(self, coords):
+        """
+        Returns the amount of moves from the source to coords, or None if it can't be reached.
+        """
+        i = self.grid.index(coords)
+        self.search_until(i)
+        d = self.distances[i]
+        return d if d >= 0 else None
+
+    def path_to(self, coords):
+        """
+        Returns a shortest list of coordinates from the source to coords by walking down the
+        field from coords, or None if it can't be reached.
+        """
+        grid = self.grid
+        distances = self.distances
+        offsets, neighbours = grid.adjacency(self.moves_per_turn)
+        cells = grid.coords_table()
+        
+        i = grid.index(coords)
+        self.search_until(i)
+        if distances[i] < 0:
+            return None
+        
+        path = [cells[i]]
+        while distances[i]:
+            for j in neighbours[offsets[i]:offsets[i + 1]]:
+                if distances[j] == distances[i] - 1:
+                    i = j
+                    break
+            path.append(cells[i])
+        path.reverse()
+        return path
+
+
 class AStarNode(object):
 
+    __slots__ = ("pos", "f", "g", "h")
+
     def __init__(self, pos, g, h):
         self.pos = pos
         self.f = g + h
@@ -346,37 +941,188 @@ class AStarNode(object):
             self.pos[0], self.pos[1], self.f, self.g, self.h)
 
 
+class SuspendedSearch(object):
+    """
+    The state of an A* search which ran out of budget, to be carried on with on a later move
+    while the target, walls and moves per turn stay the same. It goes on avoiding the squares
+    its player was avoiding when it started, as a search can't be carried on around different
+    ones. trail holds the squares the character has stood on since, starting where the search
+    did.
+    """
+
+    def __init__(self, grid, target, moves_per_turn, start_node, avoid_set, jump_points,
+            sequence, open_set, open_heap, closed_set, came_from):
+        self.target = target
+        self.wall_version = grid.wall_version
+        self.moves_per_turn = moves_per_turn
+        self.start_node = start_node
+        # The player's avoid_set is changed in place between moves, so keep a copy
+        self.avoid = bytearray(avoid_set.mask)
+        if jump_points is not None and jump_points.avoid_mask is not None:
+            jump_points = JumpPoints(grid, self.avoid)
+        self.jump_points = jump_points
+        self.sequence = sequence
+        self.open_set = open_set
+        self.open_heap = open_heap
+        self.closed_set = closed_set
+        self.came_from = came_from
+        self.nearest = start_node
+        self.trail = [start_node.pos]
+
+
 class Player(object):
 
     __metaclass__ = ABCMeta
 
-    def __init__(self, game):
+    def __init__(self, game, use_heuristic_table=True, incremental=False,
+            use_distance_fields=False, use_jump_points=False, use_path_cache=False,
+            use_hierarchy=False, search_budget=None, search_time=None, use_connectivity=False):
+        """
+        Parameters:
+        use_heuristic_table:
+            Keep a HeuristicTable for the current target between searches.
+        incremental:
+            Replan with a MovingTargetPlanner, which keeps its search between ticks, instead
+            of a fresh A* search. successors_evaluated isn't fired in this mode.
+        use_distance_fields:
+            Measure distances with the game's DistanceFields, which go around walls, rather
+            than as the crow flies, and read paths off them when they miss the avoid_set.
+        use_jump_points:
+            Search with Jump Point Search rather than plain A* when our character moves one
+            square at a time. Characters moving further per turn always use A*.
+        use_path_cache:
+            Look paths up in, and add them to, the grid's PathCache before searching.
+        use_hierarchy:
+            Plan over the grid's ClusterGraph, which only works out the first few clusters of
+            the path, rather than searching square by square all the way to the target. Meant
+            for very large grids.
+        search_budget:
+            Most nodes an A* search may expand in one move. A search which runs out carries
+            on where it left off on the next move, while our character heads for the square
+            nearest the target which it has reached.
+        search_time:
+            Most seconds an A* search may take in one move, like search_budget.
+        use_connectivity:
+            Check targets against the grid's Components, and our avoid_set, before searching
+            for them, so that one which can't be reached is given up on straight away and
+            apples which can't be reached aren't viable.
+        """
         self.game = game
+        self.use_heuristic_table = use_heuristic_table
+        self.heuristic_table = None
+        self.incremental = incremental
+        self.planner = None
+        self.use_distance_fields = use_distance_fields
+        self.use_jump_points = use_jump_points
+        self.jump_points = None
+        self.use_path_cache = use_path_cache
+        self.use_hierarchy = use_hierarchy
+        # The path last planned over the ClusterGraph, the hops between entrances left to
+        # refine after its end and the wall_version they were found at
+        self.plan = None
+        self.search_budget = search_budget
+        self.search_time = search_time
+        self.search = None
+        self.use_connectivity = use_connectivity
+        # The Pieces our avoid_set cut the grid into when it was last checked, what we could
+        # reach from where we were, and the position, wall layout and avoid_set they were
+        # worked out for
+        self.pieces = None
+        self.reach = None
+        self.reach_key = None
+        self.nodes_expanded = 0
         self.path = None
         self.path_progress = 0
-        self.avoid_set = set()
-        self.path_interruptions = [self.target_gone]
+        self.avoid_set = GridOverlay(game.grid)
+        self.path_interruptions = [self.target_gone, self.plan_due]
         self.path_found = Event()
         self.successors_evaluated = Event()
         self.target_character = None
 
-    def viable_apples(self):
-        # Find the distances to the apples
+    def viable_apples(self, limit=None):
+        # Find the distances to the apples, nearest first, stopping at limit
         # Disregard any apples we can't get to in time
         ## Give them a score based on how close/far they are from the other player?
         ## The further the better for the runner, the closer the better for the chaser.
-        viable_apples = []
-        for apple in game.apples:
-            distance = Grid.distance(self.character.position, apple.position,
-                self.character.max_moves_per_turn)
-            if distance <= apple.shelf_life:
-                viable_apples.append({ "apple": apple, "distance": distance })
+        field = self.distance_field()
+        position = self.character.position
+        moves_per_turn = self.character.max_moves_per_turn
+        tick = self.game.ticks
+        
+        def distance(apple):
+            if self.use_connectivity and not self.reachable(apple.position):
+                return None
+            if field is None:
+                d = Grid.distance(position, apple.position, moves_per_turn)
+            else:
+                d = field.distance_to(apple.position)
+            if d is not None and d <= apple.shelf_life(tick):
+                return d
         
-        return sorted(viable_apples, key=lambda a: a["distance"])
+        return [{ "apple": apple, "distance": d } for d, apple in
+            self.game.apples.nearest(position, moves_per_turn, distance, limit)]
+
+    def reachable(self, coords):
+        """
+        Returns whether our character can get to coords without going through walls or our
+        avoid_set. Only when the avoid_set may cut the way off is the grid split into the
+        pieces it cuts it into, once for each wall layout and avoid_set, and the ones we can
+        get into worked out once for each position.
+        """
+        grid = self.game.grid
+        components = grid.components(self.character.max_moves_per_turn)
+        avoid = self.avoid_set
+        start, target = grid.index(self.character.position), grid.index(coords)
+        if start == target:
+            return True
+        if avoid.mask[target] or not components.connected(start, target):
+            return False
+        offsets, neighbours = grid.adjacency(self.character.max_moves_per_turn)
+        moves = neighbours[offsets[start]:offsets[start + 1]]
+        if target in moves:
+            return True
+        
+        key = (start, grid.wall_version, self.avoid_fingerprint())
+        if key != self.reach_key:
+            if self.reach_key is None or key[1:] != self.reach_key[1:]:
+                self.pieces = components.pieces(avoid)
+            self.reach_key = key
+            # Standing in the avoid_set we can still make our first move out of it
+            ways_out = [j for j in moves if not avoid.mask[j]] if avoid.mask[start] else [start]
+            if self.pieces is None:
+                # Whether we can get anywhere that isn't enclosed
+                self.reach = any(not components.enclosed(j, avoid) for j in ways_out)
+            else:
+                # The pieces we can get into
+                self.reach = set(self.pieces.piece(j) for j in ways_out)
+        if self.pieces is None:
+            # Nothing is cut off but the squares avoid encloses, which can only be got into
+            # from avoid, or from where we are, which has been checked
+            return self.reach and not components.enclosed(target, avoid)
+        return self.pieces.piece(target) in self.reach
+
+    def distance_field(self):
+        """
+        Returns the DistanceField from our character if we're using them, else None.
+        """
+        if not self.use_distance_fields:
+            return None
+        return self.game.distance_field(self.character.position,
+            self.character.max_moves_per_turn)
 
     def target_gone(self):
         if len(self.path) > 1:
-            return self.path[len(self.path) - 1].pos != self.target_character.position
+            end = self.path[len(self.path) - 1].pos
+            if self.plan is not None and self.plan[0] is self.path:
+                # The path is only the start of the plan, which ends at the target
+                end = self.game.grid.coords_at(self.plan[1][-1])
+            return end != self.target_character.position
+
+    def plan_due(self):
+        # Refine more of the plan at the end of the path so far, rather than standing still
+        # there for a move first
+        return self.plan is not None and self.plan[0] is self.path and \
+            self.path_progress == len(self.path) - 1
 
     def interrupt_path(self):
         for i in self.path_interruptions:
@@ -390,12 +1136,15 @@ class Player(object):
 
         if not target_coords:
             self.character.move_noop(self.game.grid)
-            return
-
-        path = self.find_path(target_coords)
-        next_move = path[1].pos if len(path) > 1 else path[0].pos
+        else:
+            path = self.find_path(target_coords)
+            next_move = path[1].pos if len(path) > 1 else path[0].pos
+            
+            self.character.move(next_move, self.game.grid)
         
-        self.character.move(next_move, self.game.grid)
+        # Deliver anything batched up by our events' handlers during this move
+        self.path_found.flush()
+        self.successors_evaluated.flush()
 
         #self.character.move(
         #    Grid.next_pos(self.character.position, target_coords,
@@ -409,98 +1158,392 @@ class Player(object):
         """
         if not from_coords: from_coords = self.character.position
         
-        distance = Grid.distance(from_coords, target_coords)
+        table = self.heuristic_table
+        if table is not None and table.matches(target_coords, self.character.max_moves_per_turn):
+            return table.moves_from(from_coords)
         
-        cost = 0
-        pos = list(from_coords)
-        while tuple(pos) != target_coords:
-            cost += 1
-            pos = Grid.next_pos(pos, target_coords, self.character.max_moves_per_turn)
+        return Grid.moves_between(from_coords, target_coords, self.character.max_moves_per_turn)
+
+    def prepare_heuristic(self, target_coords):
+        """
+        Builds the heuristic table for target_coords, keeping the existing one if the target
+        hasn't moved since it was built.
+        """
+        if not self.use_heuristic_table:
+            return
         
-        return cost
+        table = self.heuristic_table
+        if table is None or not table.matches(target_coords, self.character.max_moves_per_turn):
+            self.heuristic_table = HeuristicTable(self.game.grid.size, target_coords,
+                self.character.max_moves_per_turn)
 
-    def create_a_star_node(self, nc, pos, target_coords):
-        return AStarNode(pos,
-            Grid.distance(nc.pos, pos,
-                self.character.max_moves_per_turn) + nc.g,
-            self.heuristic_distance(target_coords, pos)
-        )
+    def prepare_jump_points(self):
+        """
+        Returns the JumpPoints to search with, or None if we're not using them. They're kept
+        between searches while the walls stay the same and there's nothing to avoid.
+        """
+        if not self.use_jump_points or self.character.max_moves_per_turn != 1:
+            return None
+        
+        grid = self.game.grid
+        if len(self.avoid_set):
+            return JumpPoints(grid, self.avoid_set.mask)
+        
+        if self.jump_points is None or self.jump_points.wall_version != grid.wall_version:
+            self.jump_points = JumpPoints(grid)
+        return self.jump_points
 
     def find_path(self, target_coords):
         """
         Use A* algorithm to plot the path with the least cost from the current position
-        to the target (apple).
+        to the target (apple). With use_jump_points the successors of each node are its
+        jump points rather than its neighbours.
         Returns list of AStarNode starting with the current position and ending with
         the target position.
         """
         self.path_progress += 1
         if self.path and self.path_progress < len(self.path) and not self.interrupt_path():
             return self.path[self.path_progress:]
-        
+
+        # The old path is dropped, so that if no new one is found we don't carry on along it
+        # later from wherever our character has got to
+        self.path = None
+
         if not target_coords:
             return [AStarNode(self.character.position, 0, 0)]
         
-        # Add the current position to open_set
-        start_node = AStarNode(self.character.position, 0, self.heuristic_distance(target_coords))
-        open_set = { start_node.pos: start_node }
-        closed_set = {}
-        came_from = {}
+        self.prepare_heuristic(target_coords)
+        
+        if self.use_connectivity and not self.reachable(target_coords):
+            return [AStarNode(self.character.position, 0, self.heuristic_distance(target_coords))]
+        
+        if self.use_path_cache:
+            grid = self.game.grid
+            coords = grid.path_cache.get(self.character.position, target_coords,
+                self.character.max_moves_per_turn, grid.wall_version, self.avoid_fingerprint())
+            if coords is not None:
+                return self.follow_path(coords, target_coords, False)
         
-        while len(open_set):
+        if self.use_distance_fields:
+            path = self.find_path_on_field(target_coords)
+            if path is not None:
+                return path
+        
+        if self.use_hierarchy:
+            path = self.find_path_hierarchical(target_coords)
+            if path is not None:
+                return path
+        
+        if self.incremental:
+            return self.find_path_incremental(target_coords)
+        
+        grid = self.game.grid
+        offsets, neighbours = grid.adjacency(self.character.max_moves_per_turn)
+        cells = grid.coords_table()
+        moves_per_turn = self.character.max_moves_per_turn
+        # Checking the handler list, which handle and unhandle change in place, is much cheaper
+        # than firing with nobody listening
+        evaluated_handlers = self.successors_evaluated.handlers
+        search = self.resumable_search(target_coords)
+        self.search = None
+        if search is None:
+            # Add the current position to open_set. open_set maps coordinates to the best node
+            # found so far, open_heap orders those nodes by (f, h, insertion order) so that
+            # ties are broken deterministically. Improved nodes are pushed again rather than
+            # updated in place, so the heap may hold stale entries which are skipped when
+            # popped.
+            start_node = AStarNode(self.character.position, 0,
+                self.heuristic_distance(target_coords))
+            avoid = self.avoid_set.mask
+            jump_points = self.prepare_jump_points()
+            sequence = count()
+            open_set = { start_node.pos: start_node }
+            open_heap = [(start_node.f, start_node.h, next(sequence), start_node)]
+            closed_set = {}
+            came_from = {}
+            trail = None
+            # The node nearest the target reached so far, to head for if we run out of budget
+            nearest = start_node
+        else:
+            # Carry on with the search which ran out of budget on an earlier move
+            start_node, avoid, jump_points = search.start_node, search.avoid, search.jump_points
+            sequence, open_set, open_heap = search.sequence, search.open_set, search.open_heap
+            closed_set, came_from, trail = search.closed_set, search.came_from, search.trail
+            nearest = search.nearest
+        
+        budget = self.search_budget
+        deadline = None if self.search_time is None else default_timer() + self.search_time
+        expanded = 0
+        
+        while open_heap:
             # Get the node from open_set which has the least amount of total cost (f)
-            sorted_open_set = sorted(open_set.iteritems(), key=lambda n: n[1].f)
-            nc = sorted_open_set[0][1]
+            nc = heappop(open_heap)[3]
+            if open_set.get(nc.pos) is not nc:
+                continue
+            
+            # Jump points can be further apart than one move, so the target isn't reached
+            # until it comes out of open_set with the lowest cost
+            if jump_points is not None and nc.pos == target_coords:
+                return self.found_path(came_from, nc, target_coords, trail)
             
             # Remove the current node from open_set and add it to closed_set
             del open_set[nc.pos]
             closed_set[nc.pos] = nc
+            self.nodes_expanded += 1
             
-            # Get list of surrounding valid coordinates for the current node and create AStarNode
-            # instances for each
-            node_successors = [self.create_a_star_node(nc, pos, target_coords) for pos in \
-                self.game.grid.surrounding_valid_coords(nc.pos,
-                    self.character.max_moves_per_turn, self.avoid_set)]
+            # Find each square reachable from the current node which isn't a wall or in our
+            # avoid_set
+            if jump_points is None:
+                i = grid.index(nc.pos)
+                successors = [cells[j] for j in neighbours[offsets[i]:offsets[i + 1]]
+                    if not avoid[j]]
+            else:
+                parent = came_from[nc.pos].pos if nc.pos in came_from else None
+                successors = jump_points.successors(nc.pos, parent, target_coords)
             
-            # For each of the nodes surrounding the current node
-            for ns in node_successors:
+            # For each of the squares surrounding the current node
+            for pos in successors:
+                g = nc.g + Grid.distance(nc.pos, pos, moves_per_turn)
+                
                 # If we've evaluated this neighbor node before and it took the same or more
-                # cost to get to it this time then move on.
-                in_closed_set = ns.pos in closed_set
-                if in_closed_set and ns.g >= closed_set[ns.pos].g:
+                # cost to get to it this time then move on. Nodes are only made for squares
+                # which get this far.
+                in_closed_set = pos in closed_set
+                if in_closed_set and g >= closed_set[pos].g:
                     continue
-                if ns.pos in open_set and ns.g >= open_set[ns.pos].g:
+                if pos in open_set and g >= open_set[pos].g:
                     continue
                 
-                if in_closed_set: del closed_set[ns.pos]
+                if in_closed_set: del closed_set[pos]
+                
+                ns = AStarNode(pos, g, self.heuristic_distance(target_coords, pos))
  
                 # Set the current node as the originating node for this coordinate
                 came_from[ns.pos] = nc
                 
                 # If we've reached our goal, reconstruct the path and return it
-                if ns.pos == target_coords:
-                    self.path = self.reconstruct_path(came_from, ns)
-                    self.path_progress = 0
-                    #Fire event
-                    self.path_found(self.path)
-                    return self.path
+                if ns.pos == target_coords and jump_points is None:
+                    return self.found_path(came_from, ns, target_coords, trail)
                 
                 # List this neighbor for evaluation
                 open_set[ns.pos] = ns
+                heappush(open_heap, (ns.f, ns.h, next(sequence), ns))
+                if ns.h < nearest.h:
+                    nearest = ns
+            
+            # Fire event, unless nobody's listening
+            if evaluated_handlers:
+                self.successors_evaluated(open_set, closed_set, self.character.position,
+                    target_coords)
             
-            # Fire event
-            self.successors_evaluated(open_set, closed_set, self.character.position, target_coords)
+            # Out of budget, so put the search aside until the next move
+            expanded += 1
+            if (budget is not None and expanded >= budget) or \
+                    (deadline is not None and default_timer() >= deadline):
+                if search is None:
+                    search = SuspendedSearch(grid, target_coords, moves_per_turn, start_node,
+                        self.avoid_set, jump_points, sequence, open_set, open_heap, closed_set,
+                        came_from)
+                search.nearest = nearest
+                self.search = search
+                self.path = None
+                return self.partial_path(search, target_coords)
         
         # We didn't reach our goal, so return our current position only
-        return [start_node]
+        return [AStarNode(self.character.position, 0, self.heuristic_distance(target_coords))]
         
-    def reconstruct_path(self, came_from, nc):
+    def resumable_search(self, target_coords):
+        """
+        Returns our SuspendedSearch if it can be carried on towards target_coords from where
+        our character is now, else None.
+        """
+        search = self.search
+        if search is None or search.target != target_coords or \
+                search.wall_version != self.game.grid.wall_version or \
+                search.moves_per_turn != self.character.max_moves_per_turn:
+            return None
+        
+        # Our character has to have got here from the end of the trail in one move, or there's
+        # no knowing how to get back to the search
+        position = self.character.position
+        last = search.trail[-1]
+        if position != last:
+            dx = abs(position[0] - last[0])
+            dy = abs(position[1] - last[1])
+            if (dx and dy) or dx + dy > search.moves_per_turn:
+                return None
+            search.trail.append(position)
+        return search
+
+    def partial_path(self, search, target_coords):
+        """
+        Returns the path from our character to the node nearest target_coords which search
+        has reached, which isn't made our path as the search carries on next move.
         """
-        Recursive function to build a list of coordinates from target, back to character.position
+        path = self.fill_path(self.reconstruct_path(search.came_from, search.nearest),
+            target_coords)
+        coords = self.splice_trail(search.trail, [node.pos for node in path])
+        return [AStarNode(pos, g, self.heuristic_distance(target_coords, pos))
+            for g, pos in enumerate(coords)]
+
+    def splice_trail(self, trail, coords):
+        """
+        Returns the squares from the end of trail, where our character is, back along it to the
+        last square of it which coords passes through, then on along coords. Both start where
+        the search did.
+        """
+        along = dict((pos, i) for i, pos in enumerate(coords))
+        k = len(trail) - 1
+        while trail[k] not in along:
+            k -= 1
+        return trail[:k:-1] + coords[along[trail[k]]:]
+        
+    def find_path_incremental(self, target_coords):
+        """
+        Plots the same length of path as find_path, but repairs the search from the previous
+        call rather than starting again.
+        """
+        if self.planner is None:
+            self.planner = MovingTargetPlanner(self.game.grid, self.character.max_moves_per_turn)
+        
+        expansions = self.planner.expansions
+        coords = self.planner.find_path(self.character.position, target_coords,
+            self.avoid_set.indexes)
+        self.nodes_expanded += self.planner.expansions - expansions
+        
+        if coords is None:
+            return [AStarNode(self.character.position, 0,
+                self.heuristic_distance(target_coords))]
+        
+        return self.follow_path(coords, target_coords)
+
+    def find_path_on_field(self, target_coords):
         """
-        if nc.pos in came_from:
-            return self.reconstruct_path(came_from, came_from[nc.pos]) + [nc]
+        Reads the path to target_coords off our DistanceField. Returns None if the path runs
+        through our avoid_set, in which case it has to be searched for.
+        """
+        coords = self.distance_field().path_to(target_coords)
+        if coords is None:
+            # Not even reachable around the walls, so there's no point searching
+            return [AStarNode(self.character.position, 0,
+                self.heuristic_distance(target_coords))]
+        
+        if any(pos in self.avoid_set for pos in coords[1:]):
+            return None
+        
+        return self.follow_path(coords, target_coords)
+
+    def find_path_hierarchical(self, target_coords):
+        """
+        Plans a path towards target_coords over the grid's ClusterGraph. The path only runs
+        as far as the start of the plan which has been worked out square by square. The rest
+        of the plan is kept, and refined a few hops at a time as our character gets to the
+        end of the path so far, until the walls change or the target moves. Returns None if
+        the path runs through our avoid_set, in which case it has to be searched for.
+        """
+        grid = self.game.grid
+        graph = grid.cluster_graph(self.character.max_moves_per_turn)
+        start, goal = grid.index(self.character.position), grid.index(target_coords)
+        plan, self.plan = self.plan, None
+        expansions = graph.expansions
+        if plan is not None and plan[2] == grid.wall_version and plan[1][0] == start and \
+                plan[1][-1] == goal:
+            found = graph.continue_path(plan[1])
         else:
-            return [nc]
+            found = graph.find_path(start, goal)
+        self.nodes_expanded += graph.expansions - expansions
+        
+        if found is None:
+            return [AStarNode(self.character.position, 0,
+                self.heuristic_distance(target_coords))]
+        
+        indexes, hops = found
+        coords = [grid.coords_at(i) for i in indexes]
+        if any(pos in self.avoid_set for pos in coords[1:]):
+            return None
+        
+        # Near shortest isn't shortest, so the path isn't cached
+        path = self.follow_path(coords, target_coords, False)
+        if hops:
+            self.plan = (path, hops, grid.wall_version)
+        return path
+
+    def follow_path(self, coords, target_coords, cache=True):
+        """
+        Makes a list of coordinates starting at our character's position our path.
+        """
+        self.path = [AStarNode(pos, g, self.heuristic_distance(target_coords, pos))
+            for g, pos in enumerate(coords)]
+        self.path_progress = 0
+        if cache:
+            self.cache_path()
+        #Fire event
+        self.path_found(self.path)
+        return self.path
+        
+    def found_path(self, came_from, nc, target_coords, trail=None):
+        """
+        Makes the path ending in nc our path, filling in the squares between jump points. A
+        search carried on from earlier moves started where the trail of squares our character
+        has moved along since does, so the path goes back along that until it joins up.
+        """
+        path = self.fill_path(self.reconstruct_path(came_from, nc), target_coords)
+        if trail is not None and len(trail) > 1:
+            # Going back along the trail is no shortest path, so it isn't cached
+            coords = self.splice_trail(trail, [node.pos for node in path])
+            return self.follow_path(coords, target_coords, False)
+        
+        self.path = path
+        self.path_progress = 0
+        if trail is None:
+            # A carried on search avoids what our avoid_set held when it started rather than
+            # what it holds now, which the cache would file the path under
+            self.cache_path()
+        #Fire event
+        self.path_found(self.path)
+        return self.path
+        
+    def fill_path(self, path, target_coords):
+        """
+        Returns path with the squares between its jump points filled in.
+        """
+        filled = path[:1]
+        for node in path[1:]:
+            x, y = filled[-1].pos
+            dx = cmp(node.pos[0], x)
+            dy = cmp(node.pos[1], y)
+            while (x, y) != node.pos and (abs(node.pos[0] - x) + abs(node.pos[1] - y)) > \
+                    self.character.max_moves_per_turn:
+                x += dx
+                y += dy
+                filled.append(AStarNode((x, y), filled[-1].g + 1,
+                    self.heuristic_distance(target_coords, (x, y))))
+            filled.append(node)
+        return filled
+        
+    def avoid_fingerprint(self):
+        return frozenset(self.avoid_set.indexes)
+
+    def cache_path(self):
+        """
+        Adds our newly found path to the grid's PathCache if we're using it.
+        """
+        if self.use_path_cache and len(self.path) > 1:
+            grid = self.game.grid
+            grid.path_cache.put([node.pos for node in self.path],
+                self.character.max_moves_per_turn, grid.wall_version, self.avoid_fingerprint())
+
+    def reconstruct_path(self, came_from, nc):
+        """
+        Builds the list of nodes from character.position to nc by following came_from back
+        from nc.
+        """
+        path = [nc]
+        while nc.pos in came_from:
+            nc = came_from[nc.pos]
+            path.append(nc)
+        path.reverse()
+        return path
 
     @abstractmethod
     def find_target_coords(self):
@@ -509,12 +1552,12 @@ class Player(object):
 
 class ChaserPlayer(Player):
 
-    def __init__(self, game):
-        super(ChaserPlayer, self).__init__(game)
+    def __init__(self, game, **kwargs):
+        super(ChaserPlayer, self).__init__(game, **kwargs)
         self.character = game.chaser
 
     def find_target_coords(self):
-        viable_apples = self.viable_apples()
+        viable_apples = self.viable_apples(1)
         target_coords = None
         self.target_character = None
     
@@ -524,7 +1567,14 @@ class ChaserPlayer(Player):
         
         # Unless an apple is closer
         if len(viable_apples):
-            runner_distance = Grid.distance(self.character.position, self.game.runner.position)
+            field = self.distance_field()
+            if field is None:
+                runner_distance = Grid.distance(self.character.position,
+                    self.game.runner.position)
+            else:
+                runner_distance = field.distance_to(self.game.runner.position)
+                if runner_distance is None:
+                    runner_distance = float("inf")
             if viable_apples[0]["distance"] < runner_distance:
                 target_coords = viable_apples[0]["apple"].position
                 self.target_character = viable_apples[0]["apple"]
@@ -534,32 +1584,71 @@ class ChaserPlayer(Player):
 
 class RunnerPlayer(Player):
 
-    def __init__(self, game, chaser_danger_zone=3):
-        super(RunnerPlayer, self).__init__(game)
+    def __init__(self, game, chaser_danger_zone=3, lookahead_time=None, lookahead_range=8,
+            **kwargs):
+        """
+        Parameters:
+        lookahead_time:
+            Seconds to spend each move searching the runner's and chaser's moves ahead with a
+            Lookahead, whenever the chaser is within lookahead_range moves. Paths are only
+            searched for while it's further away. None turns the lookahead off.
+        """
+        super(RunnerPlayer, self).__init__(game, **kwargs)
         self.character = game.runner
-        self.window = window
         self.chaser_danger_zone = chaser_danger_zone
         self.path_interruptions.append(self.in_danger_zone)
+        self.lookahead_time = lookahead_time
+        self.lookahead_range = lookahead_range
+        self.lookahead = None
+        if lookahead_time is not None:
+            self.lookahead = Lookahead(game, game.runner.max_moves_per_turn,
+                game.chaser.max_moves_per_turn)
+
+    def make_move(self):
+        chaser = self.game.chaser
+        if self.lookahead is None or Grid.distance(self.character.position, chaser.position,
+                chaser.max_moves_per_turn) > self.lookahead_range:
+            return super(RunnerPlayer, self).make_move()
+        
+        # Our path is forgotten, as the lookahead's moves needn't follow it, and so is our
+        # avoid_set, as the lookahead keeps clear of the chaser itself
+        self.path = None
+        self.avoid_set.clear()
+        apples = [a["apple"].position for a in self.viable_apples(4)]
+        self.character.move(self.lookahead.choose(self.character.position, chaser.position,
+            apples, self.lookahead_time), self.game.grid)
+        self.path_found.flush()
+        self.successors_evaluated.flush()
 
     def in_danger_zone(self):
         """
         Returns distance to chaser if our character is in the danger zone, else returns 0
         """
-        chaser_distance = Grid.distance(self.character.position, self.game.chaser.position)
+        if self.use_distance_fields:
+            # How far the chaser has to go to get to us, rather than the other way round
+            chaser_distance = self.game.distance_field(self.game.chaser.position,
+                self.game.chaser.max_moves_per_turn).distance_to(self.character.position)
+            if chaser_distance is None:
+                return 0
+        else:
+            chaser_distance = Grid.distance(self.character.position,
+                self.game.chaser.position)
         if chaser_distance <= self.chaser_danger_zone:
             return chaser_distance
         else:
             return 0
         
     def find_target_coords(self):
-        viable_apples = self.viable_apples()
+        # Get a list of all valid coordinates surrounding the chaser so we can avoid it. This
+        # comes first as apples which it cuts us off from aren't viable.
+        self.avoid_set.clear()
+        self.avoid_set.update(self.game.grid.surrounding_valid_coords(
+            self.game.chaser.position, 2))
+
+        viable_apples = self.viable_apples(1)
         target_coords = None
         self.target_coords = None
 
-        # Get a list of all valid coordinates surrounding the chaser so we can avoid it
-        self.avoid_set = set(self.game.grid.surrounding_valid_coords(
-            self.game.chaser.position, 2))
-
         if len(viable_apples):
             target_coords = viable_apples[0]["apple"].position
             self.target_character = viable_apples[0]["apple"]
@@ -567,118 +1656,93 @@ class RunnerPlayer(Player):
         return target_coords
 
      
-GRID_POINT_DISTANCE = 10
 APPLE_COUNT = 2
-WALLS = []
-DRAW_OPEN_SET = False
-DRAW_CLOSED_SET = False
-DRAW_PATH = False
 
-def get_position(grid_coords):
+def central_wall(grid_size):
     """
-    Takes grid coords and returns an (x, y) tuple of the on-screen coords.
+    Returns the coordinates of a two square thick wall down the middle of the grid with a
+    single gap halfway down.
     """
-    x = (grid_coords[0] + 1) * GRID_POINT_DISTANCE
-    y = (grid_coords[1] + 1) * GRID_POINT_DISTANCE
-    return (x, y)
+    walls = []
+    for i in xrange(grid_size[1]):
+        x = grid_size[0] / 2
+        if i != grid_size[1] / 2:
+            walls.append((x, i))
+            walls.append((x - 1, i))
+    return walls
 
-def draw_grid(game, window):
-    s = game.grid.size
-    d = GRID_POINT_DISTANCE
-    
-    window.fill((0, 0, 0))
-    ix = 0
-    for x in xrange(s[0]):
-        iy = 0
-        for y in xrange(s[1]):
-            if (ix, iy) in WALLS:
-                pos = get_position((ix, iy))
-                pygame.draw.rect(window, (255, 255, 255), pygame.Rect(pos[0], pos[1], 3, 3))
-            else:
-                pygame.draw.circle(window, (40, 40, 40), get_position((ix, iy)), 1)
-            iy += 1
-        ix += 1
+def random_maze(grid_size, density=0.2, seed=0):
+    """
+    Returns the coordinates of randomly placed straight wall segments covering about density
+    of the grid, always the same for the same arguments. The corners are left clear for the
+    characters to start in.
+    """
+    rng = Random(seed)
+    width, height = grid_size
+    corners = set([(0, 0), (width - 1, 0), (0, height - 1), (width - 1, height - 1)])
+    longest = max(2, min(width, height) // 8)
+    walls = set()
+    while len(walls) < density * width * height:
+        x, y = rng.randint(0, width - 1), rng.randint(0, height - 1)
+        dx, dy = rng.choice(((1, 0), (0, 1)))
+        for _ in xrange(rng.randint(2, longest)):
+            if x >= width or y >= height:
+                break
+            if (x, y) not in corners:
+                walls.add((x, y))
+            x += dx
+            y += dy
+    return sorted(walls)
 
-def draw_character(window, character):
-    pygame.draw.circle(window, character.colour, get_position(character.position), 10)
-    
-def draw_path(path):
-    if DRAW_PATH:
-        # Fill in path
-        for node in path:
-            pygame.draw.circle(window, (0, 0, 255), get_position(node.pos), 3)
-        pygame.display.flip()
-    
-def draw_sets(open_set, closed_set, character_position, target_coords):
-    if DRAW_OPEN_SET:
-        for coords, node in open_set.iteritems():
-            if coords == character_position:
-                continue
-            pygame.draw.circle(window, (255, 255, 255), get_position(coords), 3, 1)
+if __name__ == "__main__":
+    import argparse
+    import display
 
-    if DRAW_CLOSED_SET:
-        # Fill in closed set
-        for coords, node in closed_set.iteritems():
-            if coords == character_position:
-                continue
-            red = interp(node.h, (0, Grid.distance(character_position, target_coords)), (0, 255))
-            #red = 255
-            pygame.draw.circle(window, (red, 255 - red, 0), get_position(coords), 5)
-        pygame.display.flip()
-
-def draw_all(game, window):
-    draw_grid(game, window)
-    for apple in game.apples:
-        draw_character(window, apple)
-    draw_character(window, game.runner)
-    draw_character(window, game.chaser)
-    pygame.display.flip()
+    parser = argparse.ArgumentParser(description="Watch a game of runner and chaser.")
+    parser.add_argument("--ticks-per-second", type=int, default=60,
+        help="simulation rate, 0 to run as fast as possible")
+    parser.add_argument("--frames-per-second", type=int, default=30)
+    parser.add_argument("--profile", metavar="FILE",
+        help="measure the game and write the metrics to FILE as JSON")
+    parser.add_argument("--seed", type=int, default=None,
+        help="seed for placing apples, random unless given")
+    parser.add_argument("--record", metavar="FILE", help="record the game to FILE")
+    args = parser.parse_args()
+    
+    seed = args.seed if args.seed is not None else randint(0, 2 ** 32 - 1)
+    print "Seed: %d" % seed
 
-if __name__ == "__main__":
     grid_size = (80, 45)
     runner_start_pos = (0, grid_size[1] - 1)
     chaser_start_pos = (grid_size[0] - 1, 0)
 
-    for i in xrange(grid_size[1]):
-        x = grid_size[0] / 2
-        if i != grid_size[1] / 2:
-            WALLS.append((x, i))
-            WALLS.append((x - 1, i))
-
-
-    game = Game(grid_size, runner_start_pos, chaser_start_pos, 100)
-    
-    pygame.init()
-    window = pygame.display.set_mode((
-        GRID_POINT_DISTANCE * (grid_size[0] + 1),
-        GRID_POINT_DISTANCE * (grid_size[1] + 1)))
+    game = Game(grid_size, runner_start_pos, chaser_start_pos, 100, central_wall(grid_size),
+        Random(seed))
     
-    draw_all(game, window)
+    window = display.open_window(grid_size)
+    renderer = display.Renderer(game, window)
     
     p_runner = RunnerPlayer(game)
     p_chaser = ChaserPlayer(game)
     
-    p_runner.path_found += draw_path
-    p_runner.successors_evaluated += draw_sets
+    p_runner.path_found += display.draw_path
+    p_runner.successors_evaluated += display.draw_sets
     
-    previous_scores = [0, 0]
-    while True:
-        for c in [ p_runner, p_chaser ]:
-            c.make_move()
-
-        try:
-            game.tick()
-        except Game.Win, e:
-            print "Runner won! %s" % e
-            break
-        except Game.Lose, e:
-            print "Chaser won! %s" % e
-            break
-            
-        draw_all(game, window)
-        if game.runner.score != previous_scores[0] or game.chaser.score != previous_scores[1]:
-            print "Runner score: %d, Chaser score: %d" % (game.runner.score, game.chaser.score)
-            previous_scores = [ game.runner.score, game.chaser.score ]
-        #sleep(0.25)
+    if args.profile:
+        from metrics import instrument
+        metrics = instrument(game, [ p_runner, p_chaser ])
+    if args.record:
+        from replay import Recorder
+        recorder = Recorder(open(args.record, "wb"), game, seed)
+    
+    winner, ticks = display.watch(game, [ p_runner, p_chaser ], renderer,
+        args.ticks_per_second or None, args.frames_per_second)
+    if args.record:
+        recorder.close()
+    if winner is not None:
+        print "%s won after %d ticks!" % (winner.capitalize(), ticks)
+    print "Runner score: %d, Chaser score: %d" % (game.runner.score, game.chaser.score)
     
-    draw_all(game, window)
+    if args.profile:
+        with open(args.profile, "w") as out:
+            metrics.dump(out)
@@ -0,0 +1,167 @@
+"""
+Checks AppleIndex.nearest against sorting every apple by distance, and that games keep their
+FreeCells in step with the walls and apples and let apples go off on the right tick.
+
+    python -m unittest test_apples
+"""
+import unittest
+from random import Random
+from runner_chaser import Apple, AppleIndex, FreeCells, Game, Grid
+
+class AppleIndexTest(unittest.TestCase):
+
+    def test_nearest(self):
+        rng = Random(0)
+        for _ in xrange(100):
+            size = (rng.randint(1, 60), rng.randint(1, 60))
+            index = AppleIndex(size, rng.choice((1, 3, 8)))
+            apples = []
+            for _ in xrange(rng.randint(0, 40)):
+                apple = Apple((rng.randrange(size[0]), rng.randrange(size[1])))
+                index.add(apple)
+                apples.append(apple)
+                if rng.random() < 0.2:
+                    # Apples are also taken away, on top of others and from buckets of their own
+                    gone = rng.choice(apples)
+                    index.remove(gone)
+                    apples.remove(gone)
+            self.assertEqual(len(index), len(apples))
+            self.assertEqual(list(index), apples)
+
+            for _ in xrange(10):
+                coords = (rng.randrange(size[0]), rng.randrange(size[1]))
+                moves_per_turn = rng.choice((1, 2))
+                # Distances at least the crow flies moves, some further round walls and some
+                # left out as unreachable
+                extra = dict((apple, rng.choice((0, 0, 0, 1, 5, None))) for apple in apples)
+                def distance(apple):
+                    if extra[apple] is None:
+                        return None
+                    return Grid.moves_between(coords, apple.position, moves_per_turn) + \
+                        extra[apple]
+                expected = sorted((distance(apple), order, apple)
+                    for order, apple in enumerate(apples) if distance(apple) is not None)
+                expected = [(d, apple) for d, order, apple in expected]
+
+                limit = rng.choice((None, 1, 2, 5))
+                found = index.nearest(coords, moves_per_turn, distance, limit)
+                self.assertEqual(found, expected[:limit], (size, coords, limit))
+
+    def test_at(self):
+        index = AppleIndex((10, 10))
+        first, second, third = Apple((3, 3)), Apple((3, 3)), Apple((4, 3))
+        for apple in (first, second, third):
+            index.add(apple)
+        self.assertEqual(index.at((3, 3)), (first, second))
+        index.remove(first)
+        self.assertEqual(index.at((3, 3)), (second,))
+        index.remove(second)
+        self.assertEqual(index.at((3, 3)), ())
+        self.assertNotIn((3, 3), index.squares)
+        self.assertIn(third, index)
+        self.assertNotIn(first, index)
+
+class FreeCellsTest(unittest.TestCase):
+
+    def test_take_and_give_back(self):
+        rng = Random(0)
+        grid = Grid((9, 7), [(rng.randrange(9), rng.randrange(7)) for _ in xrange(15)])
+        free = FreeCells(grid)
+        expected = set(grid.coords_at(i) for i in xrange(len(grid.walls)) if not grid.walls[i])
+        for _ in xrange(500):
+            coords = (rng.randrange(9), rng.randrange(7))
+            if rng.random() < 0.5:
+                free.discard(coords)
+                expected.discard(coords)
+            else:
+                # Walls are never given back
+                free.add(coords)
+                if not grid.is_wall(coords):
+                    expected.add(coords)
+            self.assertEqual(set(grid.coords_at(i) for i in free.cells), expected)
+            self.assertEqual(len(free), len(expected))
+            for i in xrange(len(grid.walls)):
+                self.assertEqual(grid.coords_at(i) in free, grid.coords_at(i) in expected)
+            if len(free):
+                self.assertIn(free.choice(rng.randint), expected)
+
+class GameApplesTest(unittest.TestCase):
+
+    def check_free_cells(self, game):
+        grid = game.grid
+        free = game.free_cells()
+        taken = set(apple.position for apple in game.apples)
+        expected = set(grid.coords_at(i) for i in xrange(len(grid.walls))
+            if not grid.walls[i]) - taken
+        self.assertEqual(set(grid.coords_at(i) for i in free.cells), expected)
+
+    def test_free_cells_follow_walls_and_apples(self):
+        rng = Random(1)
+        for _ in xrange(10):
+            size = (rng.randint(3, 15), rng.randint(3, 15))
+            game = Game(size, (0, 0), (size[0] - 1, size[1] - 1), win_score=10 ** 6,
+                rng=rng, apple_count=rng.randint(1, 20), apple_shelf_life=rng.randint(0, 10))
+            for _ in xrange(60):
+                # Characters jump about, eating apples, and walls come and go
+                for character in (game.runner, game.chaser):
+                    if rng.random() < 0.5:
+                        character.position = (rng.randrange(size[0]), rng.randrange(size[1]))
+                if rng.random() < 0.2:
+                    coords = (rng.randrange(size[0]), rng.randrange(size[1]))
+                    if game.grid.is_wall(coords):
+                        game.grid.remove_wall(coords)
+                    else:
+                        game.grid.add_wall(coords)
+                try:
+                    game.tick()
+                except Game.Lose:
+                    game.chaser.position = (size[0] - 1, size[1] - 1)
+                    game.runner.position = (0, 0)
+                self.check_free_cells(game)
+                self.assertLessEqual(len(game.apples), game.apple_count)
+                for apple in game.apples:
+                    if apple.expires - game.apple_shelf_life == game.ticks:
+                        # New apples go on free squares away from the characters
+                        self.assertFalse(game.grid.is_wall(apple.position))
+                        self.assertNotIn(apple.position,
+                            (game.runner.position, game.chaser.position))
+
+    def test_expiry(self):
+        rng = Random(2)
+        for shelf_life in (0, 1, 5):
+            game = Game((20, 20), (0, 0), (19, 19), rng=rng, apple_count=5,
+                apple_shelf_life=shelf_life)
+            # The tick each apple appeared at
+            born = dict((apple, 0) for apple in game.apples)
+            for _ in xrange(30):
+                before = set(game.apples)
+                game.tick()
+                for apple in before:
+                    # An apple lasts shelf_life ticks after the one it appeared at, and goes
+                    # off on the tick after that
+                    gone_off = game.ticks > born[apple] + shelf_life
+                    self.assertEqual(apple not in game.apples, gone_off,
+                        (shelf_life, game.ticks, born[apple]))
+                for apple in game.apples:
+                    if apple not in before:
+                        born[apple] = game.ticks
+                    self.assertGreaterEqual(apple.shelf_life(game.ticks), 0)
+                self.assertEqual(len(game.apples), 5)
+
+    def test_eaten_apple_leaves_expiry(self):
+        rng = Random(3)
+        game = Game((20, 20), (0, 0), (19, 19), rng=rng, apple_count=3, apple_shelf_life=4)
+        apple = next(iter(game.apples))
+        game.runner.position = apple.position
+        game.tick()
+        self.assertNotIn(apple, game.apples)
+        self.assertEqual(game.runner.score, 1)
+        # The eaten apple's heap entry goes quietly when it comes up
+        game.runner.position = (0, 0)
+        for _ in xrange(10):
+            game.tick()
+            self.assertEqual(len(game.apples), 3)
+        self.assertTrue(all(entry[2] in game.apples for entry in game.apple_expiry))
+
+if __name__ == "__main__":
+    unittest.main()
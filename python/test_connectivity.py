@@ -0,0 +1,122 @@
+"""
+Checks Player.reachable, and the Components it uses, against a breadth first search around
+walls and the avoid set on random grids, and the labels of squares outside boxes against a
+breadth first search around the box.
+
+    python -m unittest test_connectivity
+"""
+import unittest
+from collections import deque
+from random import Random
+from headless import wall_coords
+from runner_chaser import Game, Grid, GridOverlay, RunnerPlayer
+
+def bfs_reached(grid, start, avoid, moves_per_turn):
+    """
+    Returns the squares which can be reached from start without going through avoid, which
+    start itself may be in.
+    """
+    offsets, neighbours = grid.adjacency(moves_per_turn)
+    reached = set([start])
+    queue = deque([start])
+    while queue:
+        i = queue.popleft()
+        for j in neighbours[offsets[i]:offsets[i + 1]]:
+            if j not in reached and not avoid.mask[j]:
+                reached.add(j)
+                queue.append(j)
+    return reached
+
+class ReachableTest(unittest.TestCase):
+
+    def make_player(self, size, walls, rng):
+        game = Game(size, (0, 0), (size[0] - 1, size[1] - 1), walls=walls, rng=rng,
+            apple_count=0)
+        return game, RunnerPlayer(game, use_connectivity=True)
+
+    def check_reachable(self, game, player, start):
+        grid = game.grid
+        game.runner.position = start
+        moves_per_turn = game.runner.max_moves_per_turn
+        reached = bfs_reached(grid, grid.index(start), player.avoid_set, moves_per_turn)
+        for i in xrange(len(grid.walls)):
+            if not grid.walls[i]:
+                self.assertEqual(player.reachable(grid.coords_at(i)), i in reached,
+                    (grid.size, start, grid.coords_at(i), sorted(player.avoid_set.indexes)))
+
+    def test_way_in_through_start(self):
+        # Every other move into (2, 3) is from a wall or a square to avoid
+        game, player = self.make_player((17, 5), [(0, 3), (1, 3), (2, 1), (2, 2), (4, 3)],
+            Random(0))
+        for coords in [(2, 4), (3, 2), (3, 3)]:
+            player.avoid_set.add(coords)
+        self.check_reachable(game, player, (3, 3))
+
+    def test_random_avoid_sets(self):
+        rng = Random(0)
+        for _ in xrange(40):
+            size = (rng.randint(8, 30), rng.randint(8, 30))
+            walls = wall_coords(rng.choice(["central", "maze", "open"]), size)
+            game, player = self.make_player(size, walls, rng)
+            grid = game.grid
+            free = [grid.coords_at(i) for i in xrange(len(grid.walls)) if not grid.walls[i]]
+            for _ in xrange(5):
+                # A zone around a square, like the runner's avoid set round the chaser, and
+                # a few scattered squares
+                player.avoid_set.clear()
+                cx, cy = rng.choice(free)
+                radius = rng.randint(0, 4)
+                for x, y in free:
+                    if abs(x - cx) + abs(y - cy) <= radius:
+                        player.avoid_set.add((x, y))
+                for _ in xrange(rng.randint(0, 6)):
+                    player.avoid_set.add(rng.choice(free))
+                if rng.random() < 0.5:
+                    # A line across the grid as thick as a move, which cuts it in two
+                    # unless there's a gap in it
+                    x = rng.randrange(size[0])
+                    gap = rng.randrange(size[1] * 2)
+                    for y in xrange(size[1]):
+                        if y != gap:
+                            for dx in xrange(game.runner.max_moves_per_turn):
+                                player.avoid_set.add((x + dx, y))
+                for start in rng.sample(free, 3):
+                    self.check_reachable(game, player, start)
+
+class OutsideTest(unittest.TestCase):
+
+    def test_random_boxes(self):
+        rng = Random(1)
+        for _ in xrange(60):
+            size = (rng.randint(3, 30), rng.randint(3, 30))
+            walls = wall_coords(rng.choice(["central", "maze", "open"]), size)
+            walls += [(rng.randrange(size[0]), rng.randrange(size[1]))
+                for _ in xrange(size[0] * size[1] // rng.randint(3, 10))]
+            grid = Grid(size, walls)
+            moves_per_turn = rng.choice((1, 2))
+            components = grid.components(moves_per_turn)
+            for _ in xrange(3):
+                x0, y0 = rng.randrange(size[0]), rng.randrange(size[1])
+                box = (x0, y0, min(x0 + rng.randint(0, 10), size[0] - 1),
+                    min(y0 + rng.randint(0, 10), size[1] - 1))
+                inside = GridOverlay(grid, [(x, y) for x in xrange(box[0], box[2] + 1)
+                    for y in xrange(box[1], box[3] + 1)])
+                outside = components.outside(box)
+                free = [i for i in xrange(len(grid.walls))
+                    if not grid.walls[i] and not inside.mask[i]]
+                # Squares share a label exactly when they reach each other round the box
+                seen = set()
+                region_labels = []
+                for i in free:
+                    if i in seen:
+                        continue
+                    reached = bfs_reached(grid, i, inside, moves_per_turn)
+                    seen.update(reached)
+                    label = outside.label(i)
+                    region_labels.append(label)
+                    for j in reached:
+                        self.assertEqual(outside.label(j), label, (size, box, i, j))
+                self.assertEqual(len(set(region_labels)), len(region_labels), (size, box))
+
+if __name__ == "__main__":
+    unittest.main()
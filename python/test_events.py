@@ -0,0 +1,134 @@
+"""
+Checks the order Event calls its handlers in, and sampled and batched handlers.
+
+    python -m unittest test_events
+"""
+import unittest
+from events import Event
+
+class Recorder(object):
+    """
+    A handler noting what it was called with in a log shared with other Recorders.
+    """
+
+    def __init__(self, name, log):
+        self.name = name
+        self.log = log
+
+    def __call__(self, *args, **kargs):
+        self.log.append((self.name, args, kargs))
+
+def collector(log):
+    """
+    Returns a handler appending the batches it's given to log.
+    """
+    def collect(batch):
+        log.append(batch)
+    return collect
+
+class EventTest(unittest.TestCase):
+
+    def test_handlers_run_in_order_added(self):
+        log = []
+        event = Event()
+        handlers = [Recorder(name, log) for name in "dbeac"]
+        for handler in handlers:
+            event += handler
+        event(1, key=2)
+        self.assertEqual(log, [(name, (1,), { "key": 2 }) for name in "dbeac"])
+
+    def test_duplicate_handle(self):
+        log = []
+        event = Event()
+        first, second = Recorder("first", log), Recorder("second", log)
+        event.handle(first).handle(second).handle(first, every=2)
+        self.assertEqual(len(event), 2)
+        event()
+        event()
+        # first was added once, unsampled
+        self.assertEqual([name for name, args, kargs in log], ["first", "second"] * 2)
+
+    def test_unhandle(self):
+        log = []
+        event = Event()
+        first, second, third = [Recorder(name, log) for name in ("first", "second", "third")]
+        for handler in (first, second, third):
+            event += handler
+        handlers = event.handlers
+        event -= second
+        self.assertIs(event.handlers, handlers)
+        event("x")
+        self.assertEqual([name for name, args, kargs in log], ["first", "third"])
+        self.assertRaises(ValueError, event.unhandle, second)
+
+        # Handling it again puts it last
+        del log[:]
+        event += second
+        event("y")
+        self.assertEqual([name for name, args, kargs in log], ["first", "third", "second"])
+
+    def test_unhandle_wrapped(self):
+        log = []
+        event = Event()
+        handler = Recorder("sampled", log)
+        event.handle(handler, every=3, batched=True)
+        event.unhandle(handler)
+        self.assertEqual((len(event), event.subscriptions), (0, {}))
+        event(1)
+        event.flush()
+        self.assertEqual(log, [])
+
+    def test_sampled(self):
+        log = []
+        event = Event()
+        event.handle(Recorder("sampled", log), every=3)
+        for i in xrange(10):
+            event(i)
+        self.assertEqual([args[0] for name, args, kargs in log], [0, 3, 6, 9])
+
+    def test_batched(self):
+        log = []
+        event = Event()
+        event.handle(collector(log), batched=True)
+        event(1)
+        event(2, key=3)
+        self.assertEqual(log, [])
+        event.flush()
+        self.assertEqual(log, [[((1,), {}), ((2,), { "key": 3 })]])
+        # Nothing built up, so nothing delivered
+        event.flush()
+        self.assertEqual(len(log), 1)
+
+    def test_batch_size(self):
+        log = []
+        event = Event()
+        event.handle(collector(log), batch_size=2)
+        for i in xrange(5):
+            event(i)
+        self.assertEqual(log, [[((0,), {}), ((1,), {})], [((2,), {}), ((3,), {})]])
+        event.flush()
+        self.assertEqual(log[-1], [((4,), {})])
+
+    def test_sampled_batches(self):
+        log = []
+        event = Event()
+        event.handle(collector(log), every=2, batch_size=3)
+        for i in xrange(8):
+            event(i)
+        self.assertEqual(log, [[((0,), {}), ((2,), {}), ((4,), {})]])
+        event.flush()
+        self.assertEqual(log[-1], [((6,), {})])
+
+    def test_batched_and_plain_keep_their_order(self):
+        log = []
+        event = Event()
+        plain = Recorder("plain", log)
+        event.handle(Recorder("batched", log), batched=True)
+        event.handle(plain)
+        event(1)
+        event.flush()
+        self.assertEqual([name for name, args, kargs in log], ["plain", "batched"])
+        self.assertEqual(log[1][1], ([((1,), {})],))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""
+Checks ClusterGraph against a breadth first search of the whole grid on random grids.
+
+    python -m unittest test_hierarchical
+"""
+import unittest
+from collections import deque
+from random import Random
+from runner_chaser import Grid
+
+def bfs_moves(grid, start, moves_per_turn):
+    """
+    Returns the moves from start to every square it can reach.
+    """
+    offsets, neighbours = grid.adjacency(moves_per_turn)
+    moves = { start: 0 }
+    queue = deque([start])
+    while queue:
+        i = queue.popleft()
+        for j in neighbours[offsets[i]:offsets[i + 1]]:
+            if j not in moves:
+                moves[j] = moves[i] + 1
+                queue.append(j)
+    return moves
+
+def follow_plan(graph, start, goal):
+    """
+    Returns every square of ClusterGraph's path from start to goal, refining all of its hops,
+    or None if it finds none.
+    """
+    found = graph.find_path(start, goal)
+    if found is None:
+        return None
+    path, hops = found
+    while hops:
+        more, hops = graph.continue_path(hops)
+        path.extend(more[1:])
+    return path
+
+class ClusterGraphTest(unittest.TestCase):
+
+    def check_paths(self, grid, moves_per_turn, pairs):
+        graph = grid.cluster_graph(moves_per_turn)
+        offsets, neighbours = grid.adjacency(moves_per_turn)
+        for start, goal in pairs:
+            moves = bfs_moves(grid, start, moves_per_turn)
+            path = follow_plan(graph, start, goal)
+            if goal not in moves:
+                self.assertIsNone(path, (grid.size, start, goal))
+                continue
+            self.assertIsNotNone(path, (grid.size, start, goal))
+            self.assertEqual((path[0], path[-1]), (start, goal))
+            for a, b in zip(path, path[1:]):
+                self.assertIn(b, neighbours[offsets[a]:offsets[a + 1]])
+
+    def test_one_cluster_wide(self):
+        grid = Grid((16, 64))
+        self.check_paths(grid, 1, [(grid.index((0, 0)), grid.index((0, 63)))])
+
+    def test_random_grids(self):
+        rng = Random(0)
+        for _ in xrange(60):
+            size = (rng.randint(8, 40), rng.randint(8, 40))
+            grid = Grid(size, [(rng.randrange(size[0]), rng.randrange(size[1]))
+                for _ in xrange(size[0] * size[1] // 4)])
+            free = [i for i in xrange(size[0] * size[1]) if not grid.walls[i]]
+            pairs = [(rng.choice(free), rng.choice(free)) for _ in xrange(10)]
+            for moves_per_turn in (1, 2):
+                self.check_paths(grid, moves_per_turn, pairs)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Checks MovingTargetPlanner against a breadth first search as the start, goal, avoid set and
+walls change between calls on random grids.
+
+    python -m unittest test_incremental
+"""
+import unittest
+from collections import deque
+from random import Random
+from incremental import MovingTargetPlanner
+from runner_chaser import Grid
+
+def bfs_moves(grid, start, blocked, moves_per_turn):
+    """
+    Returns the moves from start to every square it can reach without going through blocked,
+    which start itself may be in.
+    """
+    offsets, neighbours = grid.adjacency(moves_per_turn)
+    moves = { start: 0 }
+    queue = deque([start])
+    while queue:
+        i = queue.popleft()
+        for j in neighbours[offsets[i]:offsets[i + 1]]:
+            if j not in moves and j not in blocked:
+                moves[j] = moves[i] + 1
+                queue.append(j)
+    return moves
+
+class MovingTargetPlannerTest(unittest.TestCase):
+
+    def check_path(self, planner, start, goal, blocked):
+        grid = planner.grid
+        moves_per_turn = planner.moves_per_turn
+        path = planner.find_path(grid.coords_at(start), grid.coords_at(goal), blocked)
+        moves = bfs_moves(grid, start, blocked, moves_per_turn)
+        message = (grid.size, moves_per_turn, start, goal, sorted(blocked))
+        if goal not in moves:
+            self.assertIsNone(path, message)
+            return None
+        self.assertIsNotNone(path, message)
+        self.assertEqual(len(path) - 1, moves[goal], message)
+
+        offsets, neighbours = grid.adjacency(moves_per_turn)
+        indexes = [grid.index(coords) for coords in path]
+        self.assertEqual((indexes[0], indexes[-1]), (start, goal), message)
+        for a, b in zip(indexes, indexes[1:]):
+            self.assertIn(b, neighbours[offsets[a]:offsets[a + 1]], message)
+            self.assertNotIn(b, blocked, message)
+        return indexes
+
+    def test_random_changes(self):
+        rng = Random(0)
+        for _ in xrange(30):
+            size = (rng.randint(6, 30), rng.randint(6, 30))
+            grid = Grid(size, [(rng.randrange(size[0]), rng.randrange(size[1]))
+                for _ in xrange(size[0] * size[1] // 5)])
+            free = [i for i in xrange(size[0] * size[1]) if not grid.walls[i]]
+            if len(free) < 2:
+                continue
+            planner = MovingTargetPlanner(grid, rng.choice((1, 2)))
+            start, goal = rng.sample(free, 2)
+            blocked = set()
+            for _ in xrange(20):
+                path = self.check_path(planner, start, goal, blocked)
+                free = [i for i in xrange(size[0] * size[1]) if not grid.walls[i]]
+
+                # The start usually moves along its path, which keeps part of the search tree,
+                # and sometimes jumps somewhere else
+                if path is not None and len(path) > 1 and rng.random() < 0.7:
+                    start = path[rng.randint(1, min(3, len(path) - 1))]
+                elif rng.random() < 0.3:
+                    start = rng.choice(free)
+
+                # The goal wanders a square at a time or jumps
+                if rng.random() < 0.8:
+                    x, y = grid.coords_at(goal)
+                    x = min(max(x + rng.randint(-1, 1), 0), size[0] - 1)
+                    y = min(max(y + rng.randint(-1, 1), 0), size[1] - 1)
+                    if not grid.walls[grid.index((x, y))]:
+                        goal = grid.index((x, y))
+                else:
+                    goal = rng.choice(free)
+
+                # Squares come into and drop out of the avoid set, sometimes the start or goal
+                for _ in xrange(rng.randint(0, 4)):
+                    blocked.add(rng.choice(free))
+                for i in rng.sample(sorted(blocked), min(len(blocked), rng.randint(0, 3))):
+                    blocked.discard(i)
+
+                if rng.random() < 0.2:
+                    # A wall appears away from the start and goal, or one goes
+                    i = rng.randrange(size[0] * size[1])
+                    if grid.walls[i]:
+                        grid.remove_wall(grid.coords_at(i))
+                    elif i != start and i != goal:
+                        grid.add_wall(grid.coords_at(i))
+                        blocked.discard(i)
+
+if __name__ == "__main__":
+    unittest.main()
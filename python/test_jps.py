@@ -0,0 +1,82 @@
+"""
+Checks that paths found with jump points are as short as plain A*'s, and made of legal moves,
+on random grids before and after their walls change.
+
+    python -m unittest test_jps
+"""
+import unittest
+from random import Random
+from runner_chaser import Game, ChaserPlayer
+
+class JumpPointsTest(unittest.TestCase):
+
+    def find_path(self, player, start, target):
+        player.character.position = start
+        player.path = None
+        return [node.pos for node in player.find_path(target)]
+
+    def check_path(self, game, path, start, target, avoid):
+        grid = game.grid
+        message = (grid.size, start, target, path)
+        self.assertEqual(path[0], start, message)
+        for (ax, ay), (bx, by) in zip(path, path[1:]):
+            self.assertEqual(abs(ax - bx) + abs(ay - by), 1, message)
+            self.assertFalse(grid.is_wall((bx, by)), message)
+            self.assertNotIn((bx, by), avoid, message)
+
+    def check_queries(self, game, plain, jumping, rng, queries):
+        grid = game.grid
+        free = [grid.coords_at(i) for i in xrange(len(grid.walls)) if not grid.walls[i]]
+        for _ in xrange(queries):
+            start, target = rng.choice(free), rng.choice(free)
+            avoid = set()
+            if rng.random() < 0.5:
+                avoid.update(rng.sample(free, min(len(free), rng.randint(1, 10))))
+                avoid.discard(start)
+            for player in (plain, jumping):
+                player.avoid_set.clear()
+                for coords in avoid:
+                    player.avoid_set.add(coords)
+
+            expected = self.find_path(plain, start, target)
+            path = self.find_path(jumping, start, target)
+            self.check_path(game, path, start, target, avoid)
+            self.assertEqual(path[-1] == target, expected[-1] == target,
+                (grid.size, start, target, sorted(avoid)))
+            if path[-1] == target:
+                self.assertEqual(len(path), len(expected), (grid.size, start, target,
+                    sorted(avoid)))
+
+    def make_game(self, rng):
+        size = (rng.randint(6, 40), rng.randint(6, 40))
+        walls = [(rng.randrange(size[0]), rng.randrange(size[1]))
+            for _ in xrange(size[0] * size[1] // rng.randint(3, 8))]
+        walls = [coords for coords in walls if coords not in ((0, 0), (size[0] - 1, 0))]
+        return Game(size, (0, 0), (size[0] - 1, 0), walls=walls, rng=rng, apple_count=0)
+
+    def test_random_grids(self):
+        rng = Random(0)
+        for _ in xrange(40):
+            game = self.make_game(rng)
+            self.check_queries(game, ChaserPlayer(game),
+                ChaserPlayer(game, use_jump_points=True), rng, 20)
+
+    def test_wall_changes(self):
+        rng = Random(1)
+        for _ in xrange(20):
+            game = self.make_game(rng)
+            grid = game.grid
+            # The players are kept, so the jump points found before the walls change have to
+            # be thrown away
+            plain, jumping = ChaserPlayer(game), ChaserPlayer(game, use_jump_points=True)
+            for _ in xrange(5):
+                self.check_queries(game, plain, jumping, rng, 5)
+                for _ in xrange(rng.randint(1, 10)):
+                    coords = (rng.randrange(grid.size[0]), rng.randrange(grid.size[1]))
+                    if grid.is_wall(coords):
+                        grid.remove_wall(coords)
+                    else:
+                        grid.add_wall(coords)
+
+if __name__ == "__main__":
+    unittest.main()
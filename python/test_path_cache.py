@@ -0,0 +1,122 @@
+"""
+Checks PathCache hits, suffix hits and eviction, and that players using it don't get paths
+back once the walls or their avoid set have changed.
+
+    python -m unittest test_path_cache
+"""
+import unittest
+from random import Random
+from runner_chaser import Game, PathCache, RunnerPlayer
+
+def straight_path(y, length):
+    return [(x, y) for x in xrange(length)]
+
+class PathCacheTest(unittest.TestCase):
+
+    def check_suffixes(self, cache):
+        """
+        Checks that every suffix points into a cached path at the square it's filed under.
+        """
+        for suffix_key, (key, offset) in cache.suffixes.iteritems():
+            self.assertIn(key, cache.paths)
+            self.assertEqual(cache.paths[key][offset], suffix_key[0])
+            self.assertEqual(suffix_key[1:], key[1:])
+
+    def test_hits(self):
+        cache = PathCache()
+        path = straight_path(0, 6)
+        cache.put(path, 1, 0)
+        self.assertEqual(cache.get((0, 0), (5, 0), 1, 0), tuple(path))
+        self.assertEqual(cache.get((2, 0), (5, 0), 1, 0), tuple(path[2:]))
+        self.assertEqual((cache.hits, cache.suffix_hits, cache.misses), (1, 1, 0))
+
+    def test_misses(self):
+        cache = PathCache()
+        cache.put(straight_path(0, 6), 1, 0, frozenset([7]))
+        self.assertIsNone(cache.get((0, 0), (4, 0), 1, 0, frozenset([7])))
+        self.assertIsNone(cache.get((0, 0), (5, 0), 2, 0, frozenset([7])))
+        self.assertIsNone(cache.get((0, 0), (5, 0), 1, 1, frozenset([7])))
+        self.assertIsNone(cache.get((0, 0), (5, 0), 1, 0))
+        # The target isn't a start of its own path
+        self.assertIsNone(cache.get((5, 0), (5, 0), 1, 0, frozenset([7])))
+        self.assertEqual(cache.misses, 5)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = PathCache(capacity=2)
+        first, second, third = [straight_path(y, 5) for y in xrange(3)]
+        cache.put(first, 1, 0)
+        cache.put(second, 1, 0)
+        # A suffix hit counts as a use of the whole path
+        self.assertIsNotNone(cache.get((1, 0), (4, 0), 1, 0))
+        cache.put(third, 1, 0)
+        self.assertIsNotNone(cache.get((0, 0), (4, 0), 1, 0))
+        self.assertIsNone(cache.get((0, 1), (4, 1), 1, 0))
+        self.assertIsNone(cache.get((2, 1), (4, 1), 1, 0))
+        self.assertIsNotNone(cache.get((0, 2), (4, 2), 1, 0))
+        self.check_suffixes(cache)
+        self.assertEqual(len(cache.suffixes), 6)
+
+    def test_replaced_path(self):
+        cache = PathCache()
+        cache.put(straight_path(0, 6), 1, 0)
+        shorter = [(0, 0), (0, 1), (5, 0)]
+        cache.put(shorter, 2, 0)
+        cache.put([(0, 0), (5, 0)], 1, 0)
+        self.assertIsNone(cache.get((3, 0), (5, 0), 1, 0))
+        self.assertEqual(cache.get((0, 1), (5, 0), 2, 0), ((0, 1), (5, 0)))
+        self.check_suffixes(cache)
+
+    def test_random_puts_keep_suffixes_tidy(self):
+        rng = Random(0)
+        cache = PathCache(capacity=8)
+        for _ in xrange(500):
+            start = (rng.randrange(10), rng.randrange(10))
+            target = (rng.randrange(10), rng.randrange(10))
+            middle = [(rng.randrange(10), rng.randrange(10)) for _ in xrange(rng.randint(0, 5))]
+            cache.put([start] + middle + [target], 1, rng.randrange(2))
+            self.assertLessEqual(len(cache.paths), cache.capacity)
+            self.check_suffixes(cache)
+        cache.clear()
+        self.assertEqual((len(cache.paths), len(cache.suffixes)), (0, 0))
+
+class PlayerPathCacheTest(unittest.TestCase):
+
+    def find_path(self, player, target):
+        player.path = None
+        return [node.pos for node in player.find_path(target)]
+
+    def make_player(self):
+        game = Game((12, 5), (0, 2), (11, 4), rng=Random(0), apple_count=0)
+        return game, RunnerPlayer(game, use_path_cache=True)
+
+    def test_hit(self):
+        game, player = self.make_player()
+        path = self.find_path(player, (10, 2))
+        expanded = player.nodes_expanded
+        self.assertEqual(self.find_path(player, (10, 2)), path)
+        self.assertEqual(player.nodes_expanded, expanded)
+
+    def test_wall_change(self):
+        game, player = self.make_player()
+        path = self.find_path(player, (10, 2))
+        game.grid.add_wall(path[len(path) // 2])
+        moved = self.find_path(player, (10, 2))
+        self.assertEqual(moved[-1], (10, 2))
+        self.assertNotIn(path[len(path) // 2], moved)
+
+    def test_avoid_set_change(self):
+        game, player = self.make_player()
+        path = self.find_path(player, (10, 2))
+        player.avoid_set.add(path[len(path) // 2])
+        moved = self.find_path(player, (10, 2))
+        self.assertEqual(moved[-1], (10, 2))
+        self.assertNotIn(path[len(path) // 2], moved)
+
+        # Back to the old avoid set, the old path is handed out again
+        player.avoid_set.clear()
+        expanded = player.nodes_expanded
+        self.assertEqual(self.find_path(player, (10, 2)), path)
+        self.assertEqual(player.nodes_expanded, expanded)
+
+if __name__ == "__main__":
+    unittest.main()
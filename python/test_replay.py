@@ -0,0 +1,100 @@
+"""
+Checks that replay logs bring back the game state at any tick, in whole logs and in logs
+which were cut short.
+
+    python -m unittest test_replay
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from random import Random
+from headless import step, wall_coords
+from replay import Recorder, Replay, TICK
+from runner_chaser import Game, RunnerPlayer, ChaserPlayer
+
+def game_state(game):
+    return (game.ticks, game.runner.position, game.chaser.position, game.runner.score,
+        game.chaser.score, sorted((apple.position, apple.expires) for apple in game.apples))
+
+class ReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def record(self, seed, size, walls, ticks, keyframe_interval, **game_options):
+        """
+        Plays and records a game, returning the log's bytes and the state of the game after
+        every tick.
+        """
+        game = Game(size, (0, size[1] - 1), (size[0] - 1, 0), walls=wall_coords(walls, size),
+            rng=Random(seed), **game_options)
+        players = [RunnerPlayer(game), ChaserPlayer(game)]
+        path = os.path.join(self.directory, "%d.replay" % seed)
+        recorder = Recorder(open(path, "wb"), game, seed, keyframe_interval)
+        states = [game_state(game)]
+        for _ in xrange(ticks):
+            winner = step(game, players)
+            states.append(game_state(game))
+            if winner is not None:
+                break
+        recorder.close()
+        with open(path, "rb") as f:
+            return f.read(), states
+
+    def check_seek(self, replay, states, ticks):
+        for tick in ticks:
+            self.assertEqual(game_state(replay.seek(tick)), states[tick], tick)
+
+    def test_seek(self):
+        data, states = self.record(0, (40, 30), "central", 300, 50, win_score=10 ** 6)
+        replay = Replay(data)
+        self.assertEqual((replay.ticks, replay.seed, replay.winner), (300, 0, None))
+        self.assertEqual(replay.keyframe_ticks, range(0, 301, 50))
+        # Either side of keyframes, and the ends
+        self.check_seek(replay, states, [0, 1, 49, 50, 51, 99, 100, 101, 250, 299, 300])
+        self.assertRaises(ValueError, replay.seek, 301)
+
+        played = [game_state(game) for game in replay.play(99, 140)]
+        self.assertEqual(played, states[99:141])
+
+    def test_winner(self):
+        data, states = self.record(1, (20, 12), "open", 5000, 100, win_score=5)
+        replay = Replay(data)
+        self.assertIsNotNone(replay.winner)
+        self.assertEqual(replay.ticks, len(states) - 1)
+        self.check_seek(replay, states, [replay.ticks - 1, replay.ticks])
+
+    def test_many_apples(self):
+        # Every apple goes off at once, so hundreds are spawned in a single tick
+        data, states = self.record(2, (80, 45), "maze", 30, 8, win_score=10 ** 6,
+            apple_count=600, apple_shelf_life=5)
+        replay = Replay(data)
+        self.assertEqual(replay.ticks, 30)
+        self.check_seek(replay, states, xrange(31))
+        offset = replay.seek_offset(5)[1]
+        self.assertGreater(TICK.unpack_from(data, offset)[2], 255)
+
+    def test_cut_short(self):
+        data, states = self.record(3, (40, 30), "maze", 120, 25, win_score=10 ** 6,
+            apple_count=300, apple_shelf_life=10)
+        end = Replay(data).keyframe_offsets[-1]
+        rng = Random(3)
+        for cut in sorted(rng.sample(xrange(len(data) // 4, end), 20)) + [end, end + 1]:
+            replay = Replay(data[:cut])
+            self.assertIsNone(replay.winner)
+            self.assertTrue(0 < replay.ticks < 120, cut)
+            self.assertEqual(replay.keyframe_ticks,
+                range(0, replay.ticks + 1, 25)[:len(replay.keyframe_ticks)])
+            self.check_seek(replay, states, [0, replay.ticks // 2, replay.ticks])
+
+            # The tick after the last one read didn't fit before the cut
+            whole = Replay(data)
+            offset = whole.seek_offset(replay.ticks + 1)[1]
+            self.assertGreater(offset, cut)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+"""
+Checks that searches carried on across moves don't leak into the PathCache.
+
+    python -m unittest test_search_budget
+"""
+import unittest
+from random import Random
+from runner_chaser import Game, RunnerPlayer
+
+class SearchBudgetTest(unittest.TestCase):
+
+    def test_resumed_search_is_not_cached(self):
+        game = Game((20, 5), (0, 2), (19, 4), rng=Random(0), apple_count=0)
+        player = RunnerPlayer(game, search_budget=3, use_path_cache=True)
+        target = (19, 2)
+        player.find_path(target)
+        self.assertIsNotNone(player.search)
+
+        # The avoid set changes while the search, which started without it, carries on
+        for y in xrange(5):
+            player.avoid_set.add((5, y))
+        while player.search is not None:
+            player.path = None
+            player.find_path(target)
+
+        grid = game.grid
+        cached = grid.path_cache.get((0, 2), target, game.runner.max_moves_per_turn,
+            grid.wall_version, player.avoid_fingerprint())
+        self.assertIsNone(cached)
+
+if __name__ == "__main__":
+    unittest.main()
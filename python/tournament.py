@@ -0,0 +1,194 @@
+"""
+Plays many seeded games for every combination of AI and game parameters across a pool of
+processes, and reports the runner's win rate for each combination.
+
+    python tournament.py --games 2000 --danger-zone 2,3,4 --apple-count 2,10 --workers 8
+"""
+import argparse
+import hashlib
+import itertools
+import multiprocessing
+import sys
+import time
+from math import sqrt
+from headless import simulate, grid_size_arg, WALL_LAYOUTS
+
+PARAMETERS = ["grid_size", "apple_count", "apple_shelf_life", "chaser_danger_zone"]
+
+def game_seed(base_seed, game_index):
+    """
+    Derives the seed for a game from the tournament seed. Every parameter cell plays the
+    same seeds, so cells are compared over the same sequence of games, and a game's seed
+    doesn't depend on which worker plays it.
+    """
+    digest = hashlib.sha1("%d:%d" % (base_seed, game_index)).hexdigest()
+    return int(digest[:16], 16)
+
+def wilson_interval(successes, trials, z=1.96):
+    """
+    Wilson score interval for a binomial proportion, 95% by default.
+    """
+    if not trials:
+        return (0.0, 1.0)
+    p = float(successes) / trials
+    denominator = 1 + z * z / trials
+    centre = (p + z * z / (2 * trials)) / denominator
+    spread = z * sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denominator
+    return (max(0.0, centre - spread), min(1.0, centre + spread))
+
+
+class CellStats(object):
+    """
+    Aggregated results of all games played with one combination of parameters.
+    """
+
+    def __init__(self, params):
+        self.params = params
+        self.games = 0
+        self.runner_wins = 0
+        self.chaser_wins = 0
+        self.unfinished = 0
+        self.ticks = 0
+        self.nodes_expanded = 0
+
+    def add(self, winner, ticks, nodes_expanded):
+        self.games += 1
+        if winner == "runner":
+            self.runner_wins += 1
+        elif winner == "chaser":
+            self.chaser_wins += 1
+        else:
+            self.unfinished += 1
+        self.ticks += ticks
+        self.nodes_expanded += nodes_expanded
+
+    def runner_win_rate(self):
+        return float(self.runner_wins) / self.games if self.games else 0.0
+
+    def runner_win_interval(self):
+        return wilson_interval(self.runner_wins, self.games)
+
+    def mean_ticks(self):
+        return float(self.ticks) / self.games if self.games else 0.0
+
+
+def play_chunk(task):
+    """
+    Plays a chunk of games for one parameter cell in a worker process. Only the fields
+    needed for aggregation are sent back, to keep the traffic between processes small.
+    """
+    cell_index, params, settings, seeds = task
+    results = []
+    for seed in seeds:
+        r = simulate(seed, params["grid_size"], settings["walls"], settings["win_score"],
+            settings["max_ticks"], params["apple_count"], params["apple_shelf_life"],
+            params["chaser_danger_zone"])
+        results.append((r.winner, r.ticks, r.runner_nodes_expanded + r.chaser_nodes_expanded))
+    return cell_index, results
+
+def run_tournament(cells, games, seed=0, walls="central", win_score=100, max_ticks=100000,
+        workers=None, chunk_size=20, progress=None):
+    """
+    Plays games for each cell, a dict of PARAMETERS, and returns a list of CellStats in the
+    same order as cells. The results only depend on the arguments, not on the amount of
+    workers or the order in which chunks finish.
+
+    Parameters:
+    workers:
+        Amount of worker processes. Defaults to the amount of CPUs, 1 plays every game in
+        this process.
+    progress:
+        Optional function called with (games_played, games_total) as chunks come back.
+    """
+    settings = { "walls": walls, "win_score": win_score, "max_ticks": max_ticks }
+    seeds = [game_seed(seed, i) for i in xrange(games)]
+    tasks = [(cell_index, params, settings, seeds[i:i + chunk_size])
+        for cell_index, params in enumerate(cells) for i in xrange(0, games, chunk_size)]
+    stats = [CellStats(params) for params in cells]
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        chunks = pool.imap_unordered(play_chunk, tasks)
+    else:
+        pool = None
+        chunks = itertools.imap(play_chunk, tasks)
+
+    try:
+        played = 0
+        for cell_index, results in chunks:
+            for winner, ticks, nodes_expanded in results:
+                stats[cell_index].add(winner, ticks, nodes_expanded)
+            played += len(results)
+            if progress:
+                progress(played, games * len(cells))
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    return stats
+
+def parameter_cells(**values):
+    """
+    Returns a cell for every combination of the given lists of PARAMETERS values.
+    """
+    return [dict(zip(PARAMETERS, combination))
+        for combination in itertools.product(*[values[p] for p in PARAMETERS])]
+
+def int_list_arg(value):
+    return [None if v == "default" else int(v) for v in value.split(",")]
+
+def grid_size_list_arg(value):
+    return [grid_size_arg(v) for v in value.split(",")]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Sweep runner/chaser parameters over many seeded games.")
+    parser.add_argument("--games", type=int, default=1000, help="games per parameter cell")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None,
+        help="worker processes, defaults to the amount of CPUs")
+    parser.add_argument("--chunk-size", type=int, default=20,
+        help="games per task sent to a worker")
+    parser.add_argument("--walls", choices=sorted(WALL_LAYOUTS), default="central")
+    parser.add_argument("--win-score", type=int, default=100)
+    parser.add_argument("--max-ticks", type=int, default=100000)
+    parser.add_argument("--size", type=grid_size_list_arg, default=[(80, 45)],
+        help="comma separated grid sizes, e.g. 80x45,160x90")
+    parser.add_argument("--apple-count", type=int_list_arg, default=[None],
+        help="comma separated apple counts")
+    parser.add_argument("--shelf-life", type=int_list_arg, default=[None],
+        help="comma separated apple shelf lives")
+    parser.add_argument("--danger-zone", type=int_list_arg, default=[3],
+        help="comma separated RunnerPlayer.chaser_danger_zone values")
+    args = parser.parse_args(argv)
+
+    cells = parameter_cells(grid_size=args.size, apple_count=args.apple_count,
+        apple_shelf_life=args.shelf_life, chaser_danger_zone=args.danger_zone)
+
+    def progress(played, total):
+        sys.stderr.write("\r%d/%d games" % (played, total))
+        sys.stderr.flush()
+
+    started = time.time()
+    stats = run_tournament(cells, args.games, args.seed, args.walls, args.win_score,
+        args.max_ticks, args.workers, args.chunk_size, progress)
+    sys.stderr.write("\n")
+
+    print "%-9s %6s %6s %6s %6s %8s %17s %8s %8s" % ("size", "apples", "shelf", "danger",
+        "games", "runner", "95% interval", "chaser", "ticks")
+    for s in stats:
+        low, high = s.runner_win_interval()
+        p = s.params
+        print "%-9s %6s %6s %6s %6d %7.1f%% %7.1f%% - %5.1f%% %8d %8.1f" % (
+            "%dx%d" % p["grid_size"],
+            "default" if p["apple_count"] is None else p["apple_count"],
+            "default" if p["apple_shelf_life"] is None else p["apple_shelf_life"],
+            p["chaser_danger_zone"], s.games, 100 * s.runner_win_rate(), 100 * low,
+            100 * high, s.chaser_wins, s.mean_ticks())
+    print "%d games in %.2fs" % (sum(s.games for s in stats), time.time() - started)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Writes every tick of many games to fixed width records in columns of numpy memory-mapped
+files, so that analysis can slice the ticks of any game without loading the rest.
+
+A trajectory directory holds chunks of chunk_rows ticks, each a directory of .npy files with
+one column of the records in each, preallocated to the full chunk size. A game's ticks are
+always in one chunk, one after another, so the ticks of a game are a slice of each column.
+index.npy holds a record per game of its seed, chunk, first row, ticks and winner. It's
+preallocated too, growing twice as big whenever it fills up, and rows no game has been added to
+yet have chunk -1, so the games finished so far can be read while more are being played.
+
+    python headless.py --games 1000 --trajectories runs
+
+    trajectories = Trajectories("runs")
+    runner = trajectories.game(3, 100, 200)["runner"]
+
+Coordinates are -1 where there's nothing there: a player without a target and unused apple
+slots.
+"""
+import json
+import os
+import numpy as np
+from replay import hook_tick
+
+VERSION = 1
+CHUNK_ROWS = 1 << 20
+# Games the index has room for to begin with
+INDEX_ROWS = 1024
+
+# name, dtype and shape of each of a record's fields, apples being apple_slots pairs of
+# coordinates
+COLUMNS = [
+    ("tick", "<u4", ()),
+    ("runner", "<i2", (2,)),
+    ("chaser", "<i2", (2,)),
+    ("scores", "<u2", (2,)),
+    ("runner_target", "<i2", (2,)),
+    ("chaser_target", "<i2", (2,)),
+    ("apples", "<i2", ("apple_slots", 2)),
+]
+
+INDEX = np.dtype([("seed", "<i8"), ("chunk", "<i4"), ("start", "<i8"), ("ticks", "<i4"),
+    ("winner", "<i1")])
+
+WINNERS = [None, "runner", "chaser"]
+
+NOWHERE = (-1, -1)
+
+def column_shape(shape, apple_slots):
+    return tuple(apple_slots if s == "apple_slots" else s for s in shape)
+
+def chunk_path(path, chunk):
+    return os.path.join(path, "%05d" % chunk)
+
+
+class TrajectoryWriter(object):
+    """
+    Writes games to the trajectory directory path, replacing any already there. Games are
+    recorded one at a time: call record when a game starts and finish once it's over, then
+    close once every game has been. apple_slots is the most apples a tick can hold, by
+    default the first game's apple_count.
+    """
+
+    def __init__(self, path, chunk_rows=CHUNK_ROWS, apple_slots=None):
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.apple_slots = apple_slots
+        self.index = None
+        self.games = 0
+        self.grow_index()
+        self.chunk = -1
+        self.columns = None
+        # The next row of the chunk to write and the first of the game being recorded
+        self.row = 0
+        self.start = 0
+        self.game = None
+
+    def new_chunk(self):
+        """
+        Starts the next chunk, moving the ticks written so far of the game being recorded
+        into it so that its ticks stay together.
+        """
+        carried = self.row - self.start
+        if carried >= self.chunk_rows:
+            raise ValueError("A game can't last more than the %d ticks of a chunk" %
+                self.chunk_rows)
+
+        self.chunk += 1
+        directory = chunk_path(self.path, self.chunk)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        columns = {}
+        for name, dtype, shape in COLUMNS:
+            columns[name] = np.lib.format.open_memmap(os.path.join(directory, name + ".npy"),
+                mode="w+", dtype=dtype,
+                shape=(self.chunk_rows,) + column_shape(shape, self.apple_slots))
+
+        if self.columns is not None:
+            for name, column in self.columns.iteritems():
+                columns[name][:carried] = column[self.start:self.row]
+                column.flush()
+        self.columns = columns
+        self.start = 0
+        self.row = carried
+        self.write_meta()
+
+    def record(self, game, players, seed=None):
+        """
+        Records game, played by players, from its next tick onwards. Recording hooks into
+        the game's tick and the players' find_target_coords, so it carries on however the
+        game is played.
+        """
+        if self.apple_slots is None:
+            self.apple_slots = game.apple_count
+        elif game.apple_count > self.apple_slots:
+            raise ValueError("Games can hold at most %d apples, not %d" % (self.apple_slots,
+                game.apple_count))
+        if self.columns is None or self.row == self.chunk_rows:
+            self.new_chunk()
+        self.game = game
+        self.seed = seed
+        self.start = self.row
+        self.winner = None
+
+        # The targets the players chose this tick, runner first
+        self.targets = [NOWHERE, NOWHERE]
+        for player in players:
+            self.record_targets(player, 0 if player.character is game.runner else 1)
+
+        def recorded(winner):
+            # Games which have been finished aren't recorded any more
+            if self.game is game:
+                if winner:
+                    self.winner = winner
+                self.record_tick()
+        hook_tick(game, recorded)
+
+    def record_targets(self, player, slot):
+        find_target_coords = player.find_target_coords
+        def recorded_find_target_coords():
+            target = find_target_coords()
+            if self.game is player.game:
+                self.targets[slot] = target or NOWHERE
+            return target
+        player.find_target_coords = recorded_find_target_coords
+
+    def record_tick(self):
+        if self.row == self.chunk_rows:
+            self.new_chunk()
+        game, columns, row = self.game, self.columns, self.row
+        apples = [apple.position for apple in game.apples]
+        if len(apples) > self.apple_slots:
+            raise ValueError("Cannot record %d apples in %d slots" % (len(apples),
+                self.apple_slots))
+
+        columns["tick"][row] = game.ticks
+        columns["runner"][row] = game.runner.position
+        columns["chaser"][row] = game.chaser.position
+        columns["scores"][row] = (game.runner.score, game.chaser.score)
+        columns["runner_target"][row] = self.targets[0]
+        columns["chaser_target"][row] = self.targets[1]
+        columns["apples"][row] = apples + [NOWHERE] * (self.apple_slots - len(apples))
+        self.targets = [NOWHERE, NOWHERE]
+        self.row += 1
+
+    def finish(self):
+        """
+        Adds the game being recorded to the index.
+        """
+        if self.games == len(self.index):
+            self.grow_index()
+        self.index[self.games] = (-1 if self.seed is None else self.seed, self.chunk,
+            self.start, self.row - self.start, self.winner or 0)
+        self.games += 1
+        self.game = None
+        self.start = self.row
+
+    def grow_index(self):
+        """
+        Replaces the index with one twice as big, or starts it. The new one is written next
+        to the old one and moved over it, so that readers never see it half written.
+        """
+        path = os.path.join(self.path, "index.npy")
+        index = np.lib.format.open_memmap(path + ".new", mode="w+", dtype=INDEX,
+            shape=(max(INDEX_ROWS, 2 * self.games),))
+        index["chunk"] = -1
+        if self.index is not None:
+            index[:self.games] = self.index[:self.games]
+        index.flush()
+        os.rename(path + ".new", path)
+        self.index = index
+
+    def write_meta(self):
+        with open(os.path.join(self.path, "meta.json"), "w") as out:
+            json.dump({ "version": VERSION, "chunk_rows": self.chunk_rows,
+                "apple_slots": self.apple_slots, "chunks": self.chunk + 1 }, out)
+
+    def close(self):
+        if self.columns is not None:
+            for column in self.columns.itervalues():
+                column.flush()
+            self.columns = None
+        self.index.flush()
+        self.write_meta()
+
+
+class Trajectories(object):
+    """
+    Reads the trajectory directory path. Columns are memory-mapped read only as they're
+    first used, so slices of them are views onto the files rather than copies.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta["version"] != VERSION:
+            raise ValueError("Cannot read trajectories of version %d" % self.meta["version"])
+        index = np.load(os.path.join(path, "index.npy"), mmap_mode="r")
+        # Games are added to the index in order, so the rows in use come first
+        self.index = index[:np.count_nonzero(index["chunk"] >= 0)]
+        self.columns = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def column(self, chunk, name):
+        column = self.columns.get((chunk, name))
+        if column is None:
+            column = self.columns[(chunk, name)] = np.load(
+                os.path.join(chunk_path(self.path, chunk), name + ".npy"), mmap_mode="r")
+        return column
+
+    def winner(self, game):
+        return WINNERS[self.index[game]["winner"]]
+
+    def game(self, game, start=0, stop=None, names=None):
+        """
+        Returns a dict of column name to the records of ticks start to stop of the game with
+        position game in the index, counting from its first recorded tick. names limits it
+        to those columns.
+        """
+        entry = self.index[game]
+        ticks = int(entry["ticks"])
+        start, stop, _ = slice(start, stop).indices(ticks)
+        first = int(entry["start"])
+        return dict((name, self.column(int(entry["chunk"]), name)[first + start:first + stop])
+            for name in (names or [c[0] for c in COLUMNS]))
+
+    def games_with_seed(self, seed):
+        return [int(i) for i in np.flatnonzero(self.index["seed"] == seed)]